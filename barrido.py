@@ -0,0 +1,102 @@
+'''
+=============================================================
+            BARRIDOS DE PARÁMETROS EN PARALELO
+=============================================================
+
+Genera escenarios (mallas o hipercubos latinos sobre los 7 parámetros y las
+condiciones iniciales), los reparte en bloques entre un grupo de procesos y
+guarda todas las trayectorias en un único archivo .sd (ver contenedor.py),
+junto con la malla, los parámetros y las condiciones iniciales de cada
+escenario. contenedor.leer(ruta) lo abre como memmap sin cargarlo en memoria.
+
+Los nombres que se pueden barrer son los de PARAMETROS (k, a_i, a_e, y, b,
+rho, mu) y los de INICIALES (s0, e0, i0, r0, p0). Lo que no se barre toma el
+valor de BASE o de logica.iniciales.
+'''
+
+import itertools
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+import contenedor
+import logica
+
+PARAMETROS = ('k', 'a_i', 'a_e', 'y', 'b', 'rho', 'mu')
+INICIALES = ('s0', 'e0', 'i0', 'r0', 'p0')
+
+# Valores por defecto de la interfaz.
+BASE = (0.05, 0.005, 0.65, 0.0, 0.1, 0.08, 0.02)
+
+
+# Convierte un diccionario {nombre: valores por escenario} en las matrices
+# params (M, 7) y z0 (M, 5).
+def escenarios(valores, n, base=BASE, iniciales=None):
+    params = np.tile(np.asarray(base, dtype=float), (n, 1))
+    z0 = np.tile(np.asarray(logica.iniciales if iniciales is None else iniciales, dtype=float), (n, 1))
+    for nombre, columna in valores.items():
+        if nombre in PARAMETROS:
+            params[:, PARAMETROS.index(nombre)] = columna
+        elif nombre in INICIALES:
+            z0[:, INICIALES.index(nombre)] = columna
+        else:
+            raise ValueError("parámetro desconocido: %s" % nombre)
+    return params, z0
+
+
+# Malla completa: todas las combinaciones de los valores dados.
+# param1: valores: {nombre: lista de valores}, por ejemplo {'k': [0.05, 0.1], 'mu': [0.01, 0.02]}.
+def malla(valores, base=BASE, iniciales=None):
+    nombres = list(valores)
+    combinaciones = np.array(list(itertools.product(*(valores[nombre] for nombre in nombres))), dtype=float)
+    return escenarios(dict(zip(nombres, combinaciones.T)), len(combinaciones), base, iniciales)
+
+
+# Hipercubo latino: n muestras en las que cada rango queda dividido en n
+# estratos y cada estrato se usa exactamente una vez.
+# param1: rangos: {nombre: (mínimo, máximo)}.
+# param2: n: Número de escenarios.
+# param3: semilla: Semilla del generador, para poder repetir el barrido.
+def hipercubo_latino(rangos, n, semilla=None, base=BASE, iniciales=None):
+    generador = np.random.default_rng(semilla)
+    valores = {}
+    for nombre, (minimo, maximo) in rangos.items():
+        u = (generador.permutation(n) + generador.random(n)) / n
+        valores[nombre] = minimo + u * (maximo - minimo)
+    return escenarios(valores, n, base, iniciales)
+
+
+# Trabajo de un proceso: resuelve un bloque de escenarios consecutivos.
+def _resolver_bloque(trabajo):
+    inicio, method, params, z0, time, dtype = trabajo
+    return inicio, logica.solve_batch(method, params, z0, time, dtype).z
+
+
+# Resuelve todos los escenarios y los escribe en disco a medida que llegan.
+# param1: method: Método registrado en logica.
+# param2: params: Matriz (M, 7).
+# param3: z0: Matriz (M, 5).
+# param4: range: Malla de tiempo con T puntos.
+# param5: ruta: Archivo .sd donde se guarda el arreglo (M, 5, T).
+# param6: procesos: Número de procesos (por defecto, uno por núcleo).
+# param7: bloque: Escenarios por unidad de trabajo. Los métodos con lote=True
+# aprovechan bloques grandes; a los implícitos les conviene uno pequeño para
+# repartir mejor la carga.
+# param8: dtype: Tipo del arreglo en disco; con np.float32 ocupa la mitad (la
+# integración se hace igual en float64).
+# Devuelve la Solucion guardada, abierta como memmap (contenedor.leer).
+def barrer(method, params, z0, range, ruta, procesos=None, bloque=None, dtype=np.float64):
+    params = np.asarray(params, dtype=float)
+    z0 = np.asarray(z0, dtype=float)
+    procesos = procesos or os.cpu_count()
+    if bloque is None:
+        bloque = 256 if logica.METODOS[method].lote else 8
+    salida = contenedor.crear(ruta, method, range, params, z0, dtype)
+    trabajos = ((inicio, method, params[inicio:inicio + bloque], z0[inicio:inicio + bloque], range, dtype)
+                for inicio in np.arange(0, len(params), bloque))
+    with Pool(procesos) as grupo:
+        for inicio, z in grupo.imap_unordered(_resolver_bloque, trabajos):
+            salida[inicio:inicio + len(z)] = z
+    salida.flush()
+    return contenedor.leer(ruta)
@@ -0,0 +1,204 @@
+'''
+=============================================================
+            MEDICIÓN DE RENDIMIENTO DE LOS MÉTODOS
+=============================================================
+
+Mide todos los métodos registrados en logica (los mismos que acepta solve)
+sobre varios horizontes y juegos de parámetros, sin interfaz gráfica.
+
+Uso:
+    python -m benchmark correr -o base.json
+    python -m benchmark correr -m "Runge-Kutta 4" -H 150 -H 1000 -r post -o rapido.json
+    python -m benchmark comparar base.json nuevo.json --tolerancia 0.2
+
+Por cada combinación (método, régimen, horizonte) se guarda:
+    tiempo: segundos de pared (el mejor de --repeticiones corridas)
+    evaluaciones: llamadas a logica.rhs (cada una evalúa F1..F5; 0 con numba)
+    memoria: pico de memoria reservada durante la corrida (bytes, tracemalloc)
+    error: máximo error absoluto contra una solución de referencia
+    avisos: advertencias emitidas (newton sin converger, desbordamientos)
+    iteraciones, fallos: iteraciones de newton y pasos sin converger (ver
+    logica.Estadisticas)
+
+Los regímenes son 'base' (los valores por defecto de la interfaz), 'rigido'
+(tasas altas, donde los métodos explícitos con h = 1 se vuelven inestables)
+y cada archivo .sd de data/. La referencia es odeint con rtol=1e-12.
+
+comparar marca como regresión un tiempo mayor que (1 + tolerancia) veces el
+anterior, o un error que crece más de 10 veces, y termina con código 1 si
+encuentra alguna.
+'''
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+import contenedor
+import logica
+from barrido import BASE
+
+HORIZONTES = (150, 1000, 10000, 100000)
+
+RIGIDO = (3.0, 0.5, 8.0, 0.1, 2.0, 0.5, 0.02)
+
+
+# Regímenes de parámetros: {nombre: params}.
+def regimenes(directorio=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')):
+    resultado = {'base': BASE, 'rigido': RIGIDO}
+    for ruta in sorted(glob.glob(os.path.join(directorio, '*.sd'))):
+        nombre = os.path.splitext(os.path.basename(ruta))[0]
+        resultado[nombre] = tuple(np.atleast_2d(contenedor.leer_params(ruta))[0].tolist())
+    return resultado
+
+
+def referencia(params, time):
+    from scipy.integrate import odeint
+    return odeint(logica.aux_odeint, logica.iniciales, time, args=tuple(params),
+                  Dfun=lambda z, t, *p: logica.jacobiana(z, p), rtol=1e-12, atol=1e-14).T
+
+
+# Cuenta las llamadas a logica.rhs mientras está activo. Los métodos buscan
+# rhs en el módulo en cada llamada, así que basta con reemplazarlo ahí.
+class ContadorRHS:
+    def __init__(self):
+        self.llamadas = 0
+
+    def __enter__(self):
+        self.original = logica.rhs
+
+        def rhs(z, params):
+            self.llamadas += 1
+            return self.original(z, params)
+
+        logica.rhs = rhs
+        return self
+
+    def __exit__(self, *error):
+        logica.rhs = self.original
+
+
+# Mide un método en un régimen y un horizonte.
+# param3: t: Malla de tiempo.
+# param4: z_ref: Solución de referencia sobre t.
+# param5: repeticiones: Corridas cronometradas; se guarda la más rápida.
+def medir(method, params, t, z_ref, repeticiones=3, backend='numpy'):
+    # La primera corrida cuenta las evaluaciones, los avisos y el error (y con
+    # numba compila, así que no entra en el tiempo).
+    with warnings.catch_warnings(record=True) as avisos, ContadorRHS() as contador:
+        warnings.simplefilter('always')
+        estado = {}
+        z = logica.solve(method, params, t, backend=backend, estado=estado)
+    estadisticas = estado.get('estadisticas', logica.Estadisticas())
+    error = float(np.abs(z - z_ref).max())
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            logica.solve(method, params, t, backend=backend)
+            tiempos.append(time.perf_counter() - inicio)
+        # tracemalloc hace más lento el código, así que va en una corrida aparte.
+        tracemalloc.start()
+        logica.solve(method, params, t, backend=backend)
+        memoria = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'metodo': method, 'backend': backend, 'tiempo': min(tiempos), 'evaluaciones': contador.llamadas,
+            'memoria': memoria, 'error': error if np.isfinite(error) else None, 'avisos': len(avisos),
+            'iteraciones': int(estadisticas.iteraciones.sum()), 'fallos': estadisticas.fallos}
+
+
+# Corre todas las combinaciones y devuelve el diccionario que se guarda en JSON.
+def correr(metodos=None, horizontes=HORIZONTES, nombres=None, repeticiones=3, backend='numpy', salida=sys.stdout):
+    metodos = metodos or list(logica.METODOS)
+    todos = regimenes()
+    nombres = nombres or list(todos)
+    resultados = []
+    for nombre in nombres:
+        params = todos[nombre]
+        for horizonte in horizontes:
+            t = np.arange(0, horizonte + 1, dtype=float)
+            z_ref = referencia(params, t)
+            for method in metodos:
+                medida = medir(method, params, t, z_ref, repeticiones, backend)
+                medida.update(regimen=nombre, horizonte=horizonte)
+                resultados.append(medida)
+                if salida is not None:
+                    print("%-20s %-20s %7d %10.4f s %9d rhs %9.2e" % (
+                        nombre, method, horizonte, medida['tiempo'], medida['evaluaciones'],
+                        np.nan if medida['error'] is None else medida['error']), file=salida)
+    return {'entorno': {'python': platform.python_version(), 'numpy': np.__version__,
+                        'plataforma': platform.platform(), 'procesador': platform.processor(),
+                        'fecha': time.strftime('%Y-%m-%d %H:%M:%S')},
+            'resultados': resultados}
+
+
+def _clave(medida):
+    return medida['metodo'], medida['backend'], medida['regimen'], medida['horizonte']
+
+
+# Compara dos corridas y devuelve la lista de regresiones, cada una como
+# (clave, campo, valor anterior, valor nuevo).
+def comparar(anterior, actual, tolerancia=0.2):
+    previas = {_clave(medida): medida for medida in anterior['resultados']}
+    regresiones = []
+    for medida in actual['resultados']:
+        previa = previas.get(_clave(medida))
+        if previa is None:
+            continue
+        if medida['tiempo'] > (1 + tolerancia) * previa['tiempo']:
+            regresiones.append((_clave(medida), 'tiempo', previa['tiempo'], medida['tiempo']))
+        if previa['error'] is not None and (medida['error'] is None or
+                                            medida['error'] > 10 * max(previa['error'], 1e-14)):
+            regresiones.append((_clave(medida), 'error', previa['error'], medida['error']))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description='Rendimiento de los métodos.')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    medicion = comandos.add_parser('correr', help='mide los métodos y guarda un JSON')
+    medicion.add_argument('-m', '--metodo', action='append', help='método (por defecto todos)')
+    medicion.add_argument('-H', '--horizonte', action='append', type=int, help='pasos (por defecto 150 a 100000)')
+    medicion.add_argument('-r', '--regimen', action='append', help='régimen (por defecto todos)')
+    medicion.add_argument('-n', '--repeticiones', type=int, default=3, help='corridas cronometradas')
+    medicion.add_argument('-b', '--backend', default='numpy', help="'numpy' o 'numba'")
+    medicion.add_argument('-o', '--salida', required=True, help='archivo JSON de salida')
+    comparacion = comandos.add_parser('comparar', help='busca regresiones entre dos corridas')
+    comparacion.add_argument('anterior')
+    comparacion.add_argument('actual')
+    comparacion.add_argument('-t', '--tolerancia', type=float, default=0.2, help='aumento de tiempo tolerado')
+    args = parser.parse_args(argv)
+
+    if args.comando == 'correr':
+        for metodo in args.metodo or []:
+            if metodo not in logica.METODOS:
+                parser.error('método desconocido: %s' % metodo)
+        for nombre in args.regimen or []:
+            if nombre not in regimenes():
+                parser.error('régimen desconocido: %s' % nombre)
+        resultado = correr(args.metodo, args.horizonte or HORIZONTES, args.regimen, args.repeticiones, args.backend)
+        with open(args.salida, 'w') as archivo:
+            json.dump(resultado, archivo, indent=1)
+        return 0
+
+    with open(args.anterior) as archivo:
+        anterior = json.load(archivo)
+    with open(args.actual) as archivo:
+        actual = json.load(archivo)
+    regresiones = comparar(anterior, actual, args.tolerancia)
+    for (metodo, backend, regimen, horizonte), campo, antes, ahora in regresiones:
+        print("REGRESIÓN %-20s %-20s %7d %-6s %s -> %s" % (metodo, regimen, horizonte, campo, antes, ahora))
+    print("%d regresiones" % len(regresiones))
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+'''
+=============================================================
+                CACHÉ DE SOLUCIONES DEL MODELO
+=============================================================
+
+Guarda los resultados de logica.solve / logica.solve_batch con una política
+LRU limitada en bytes, para no recalcular una solución que ya se pidió con
+el mismo método, parámetros, malla de tiempo y condiciones iniciales.
+
+Opcionalmente se puede dar un directorio: cada solución se escribe también
+ahí como <clave>.npz, de modo que otras sesiones o trabajos por lotes la
+encuentran sin recalcularla.
+'''
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+import logica
+from resultado import Solucion
+
+
+class CacheSoluciones:
+    # param1: max_bytes: Memoria máxima ocupada por las soluciones guardadas.
+    # param2: directorio: Carpeta del nivel en disco (None para no usarlo).
+    def __init__(self, max_bytes=256 * 2 ** 20, directorio=None):
+        self.max_bytes = max_bytes
+        self.directorio = directorio
+        self.bytes = 0
+        self.aciertos = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self._datos = OrderedDict()
+        if directorio is not None:
+            os.makedirs(directorio, exist_ok=True)
+
+    # Clave canónica: hash de los bytes float64 de cada argumento, así que
+    # [0.05, ...] y np.array([0.05, ...]) dan la misma clave. El diccionario
+    # estado (ver logica.extend) es una salida, no forma parte de la clave.
+    @staticmethod
+    def clave(tipo, method, params, range, z0=None, estado=None, **opciones):
+        h = hashlib.sha1()
+        h.update(("%s|%s|%s" % (tipo, method, sorted(opciones.items()))).encode())
+        for arreglo in (params, range, logica.iniciales if z0 is None else z0):
+            arreglo = np.ascontiguousarray(arreglo, dtype=np.float64)
+            h.update(str(arreglo.shape).encode())
+            h.update(arreglo.tobytes())
+        return h.hexdigest()
+
+    # Igual que logica.solve, pero devuelve la solución guardada si existe.
+    # El arreglo devuelto es de sólo lectura porque se comparte con el caché.
+    def solve(self, method, params, range, **opciones):
+        clave = self.clave('solve', method, params, range, **opciones)
+        z = self._consultar(clave)
+        if z is None:
+            z = self._guardar(clave, logica.solve(method, params, range, **opciones))
+        return z
+
+    # Igual que logica.solve_batch.
+    def solve_batch(self, method, params, z0, range):
+        clave = self.clave('batch', method, params, range, z0)
+        z = self._consultar(clave)
+        if z is None:
+            z = self._guardar(clave, logica.solve_batch(method, params, z0, range))
+        return z
+
+    # Para quien calcula por su cuenta (por ejemplo en otro hilo): consultar
+    # devuelve la solución guardada o None, y guardar la agrega al caché.
+    def consultar(self, method, params, range, **opciones):
+        return self._consultar(self.clave('solve', method, params, range, **opciones))
+
+    def guardar(self, method, params, range, z, **opciones):
+        return self._guardar(self.clave('solve', method, params, range, **opciones), z)
+
+    def _consultar(self, clave):
+        if clave in self._datos:
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return self._datos[clave]
+        ruta = self._ruta(clave)
+        if ruta is not None and os.path.exists(ruta):
+            with np.load(ruta) as archivo:
+                z = archivo['z']
+                if 't' in archivo:
+                    z = Solucion(z, archivo['t'], archivo['params'], str(archivo['metodo']))
+            self.aciertos_disco += 1
+            np.asarray(z).flags.writeable = False
+            self._insertar(clave, z)
+            return z
+        self.fallos += 1
+        return None
+
+    # z es normalmente una Solucion; en disco se guardan su trayectoria, la
+    # malla, los parámetros y el método. Un arreglo se guarda tal cual.
+    def _guardar(self, clave, z):
+        if not isinstance(z, Solucion):
+            z = np.asarray(z)
+        ruta = self._ruta(clave)
+        if ruta is not None:
+            # Se escribe a un temporal y se renombra para que otro proceso
+            # nunca lea un archivo a medio escribir.
+            temporal = ruta + '.%d.tmp' % os.getpid()
+            with open(temporal, 'wb') as archivo:
+                if isinstance(z, Solucion):
+                    np.savez(archivo, z=z.z, t=z.t, params=z.params, metodo=z.metodo)
+                else:
+                    np.savez(archivo, z=z)
+            os.replace(temporal, ruta)
+        np.asarray(z).flags.writeable = False
+        self._insertar(clave, z)
+        return z
+
+    # Las estadísticas de una Solucion no cuentan en nbytes, así que se guarda
+    # una copia con sólo sus totales (los tiempos e iteraciones de cada paso
+    # ocupan casi lo mismo que la trayectoria).
+    def _insertar(self, clave, z):
+        if isinstance(z, Solucion) and z.estadisticas is not None:
+            z = Solucion(z.z, z.t, z.params, z.metodo, None, z.estadisticas.compacta(), z.metadatos)
+        if z.nbytes > self.max_bytes:
+            return
+        while self.bytes + z.nbytes > self.max_bytes:
+            _, viejo = self._datos.popitem(last=False)
+            self.bytes -= viejo.nbytes
+            self.desalojos += 1
+        self._datos[clave] = z
+        self.bytes += z.nbytes
+
+    def _ruta(self, clave):
+        if self.directorio is None:
+            return None
+        return os.path.join(self.directorio, clave + '.npz')
+
+    # Vacía el nivel en memoria (el de disco se conserva).
+    def limpiar(self):
+        self._datos.clear()
+        self.bytes = 0
+
+    def estadisticas(self):
+        return {'aciertos': self.aciertos, 'aciertos_disco': self.aciertos_disco, 'fallos': self.fallos,
+                'desalojos': self.desalojos, 'bytes': self.bytes, 'entradas': len(self._datos)}
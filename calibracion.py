@@ -0,0 +1,123 @@
+'''
+=============================================================
+            CALIBRACIÓN DEL MODELO CON DATOS OBSERVADOS
+=============================================================
+
+Ajusta k, a_i, a_e, y, b, rho, mu (y, si se pide, las condiciones
+iniciales) a una serie de tiempo observada por mínimos cuadrados
+(scipy.optimize.least_squares).
+
+La jacobiana de los residuos sale de las sensibilidades hacia adelante
+dz/dparam de sensibilidad.py, que se integran junto con el modelo: cada
+evaluación del objetivo y de su jacobiana es una sola llamada a odeint.
+
+El CSV debe tener encabezado, una columna 'dia' y una o más columnas con
+los compartimentos observados (s, e, i, r, p) como fracción de la población:
+    dia,i,p
+    0,0.030,0.100
+    7,0.041,0.102
+'''
+
+from collections import namedtuple
+from multiprocessing import Pool
+
+import numpy as np
+
+import barrido
+import logica
+import sensibilidad
+
+COMPARTIMENTOS = sensibilidad.COMPARTIMENTOS
+
+# Límites por defecto de cada parámetro en el ajuste.
+LIMITES = {'k': (0.0, 1.0), 'a_i': (0.0, 2.0), 'a_e': (0.0, 2.0), 'y': (0.0, 1.0),
+           'b': (0.0, 1.0), 'rho': (0.0, 1.0), 'mu': (0.0, 1.0)}
+
+# params e iniciales ajustados, costo final (0.5 * suma de residuos al
+# cuadrado), costos de todos los arranques y el resultado de least_squares
+# del mejor.
+Calibracion = namedtuple('Calibracion', ['params', 'iniciales', 'costo', 'costos', 'resultado'])
+
+
+# Lee el CSV de observaciones.
+# Devuelve (dias, columnas, observados) con observados de forma (len(columnas), len(dias)).
+def leer_csv(ruta):
+    datos = np.genfromtxt(ruta, delimiter=',', names=True)
+    columnas = [nombre for nombre in datos.dtype.names if nombre in COMPARTIMENTOS]
+    if not columnas:
+        raise ValueError("el CSV no tiene columnas s, e, i, r ni p")
+    return datos['dia'], columnas, np.array([datos[nombre] for nombre in columnas])
+
+
+# Residuos y su jacobiana para least_squares. Se recuerda la última
+# integración porque least_squares pide fun(x) y jac(x) en el mismo x.
+class _Objetivo:
+    def __init__(self, dias, columnas, observados, iniciales, con_iniciales):
+        self.time = dias if dias[0] == 0 else np.concatenate(([0.0], dias))
+        self.desfase = 0 if dias[0] == 0 else 1
+        self.filas = [COMPARTIMENTOS.index(nombre) for nombre in columnas]
+        self.observados = observados
+        self.iniciales = np.asarray(iniciales, dtype=float)
+        self.con_iniciales = con_iniciales
+        self.x = None
+
+    def _integrar(self, x):
+        if self.x is None or not np.array_equal(x, self.x):
+            z0 = x[7:] if self.con_iniciales else self.iniciales
+            z, S = sensibilidad.sensibilidades(x[:7], self.time, z0, self.con_iniciales)
+            self.x, self.z, self.S = x.copy(), z[:, self.desfase:], S[:, :, self.desfase:]
+
+    def residuos(self, x):
+        self._integrar(x)
+        return (self.z[self.filas] - self.observados).ravel()
+
+    def jacobiana(self, x):
+        self._integrar(x)
+        # S[:, fila, t] ordenado como los residuos: primero por fila y luego por día.
+        return self.S[:, self.filas, :].transpose(1, 2, 0).reshape(-1, len(self.S))
+
+
+def _ajustar(trabajo):
+    from scipy.optimize import least_squares
+    objetivo, x0, limites = trabajo
+    return least_squares(objetivo.residuos, x0, jac=objetivo.jacobiana, bounds=limites)
+
+
+# Ajusta el modelo a las observaciones con varios arranques.
+# param1: observaciones: Ruta del CSV o tupla (dias, columnas, observados) como la de leer_csv.
+# param2: con_iniciales: Ajustar también s0, e0, i0, r0, p0 (entre 0 y 1).
+# param3: inicios: Número de puntos de arranque tomados de un hipercubo latino
+# dentro de los límites. Además siempre se arranca desde barrido.BASE (y las
+# iniciales dadas), que suele estar cerca de la solución y evita mínimos
+# locales lejanos.
+# param4: procesos: Procesos para correr los arranques en paralelo (1 para no usar Pool).
+# param5: limites: {parámetro: (mínimo, máximo)}; por defecto LIMITES.
+def calibrar(observaciones, con_iniciales=False, inicios=8, procesos=None, semilla=None, limites=None,
+             iniciales=None):
+    if isinstance(observaciones, str):
+        observaciones = leer_csv(observaciones)
+    dias, columnas, observados = observaciones
+    limites = dict(LIMITES, **(limites or {}))
+    iniciales = logica.iniciales if iniciales is None else iniciales
+    objetivo = _Objetivo(np.asarray(dias, dtype=float), columnas, np.asarray(observados, dtype=float),
+                         iniciales, con_iniciales)
+
+    rangos = {nombre: limites[nombre] for nombre in barrido.PARAMETROS}
+    if con_iniciales:
+        rangos.update({nombre: (0.0, 1.0) for nombre in barrido.INICIALES})
+    params, z0 = barrido.hipercubo_latino(rangos, inicios, semilla, iniciales=iniciales)
+    params, z0 = np.vstack((barrido.BASE, params)), np.vstack((iniciales, z0))
+    arranques = np.hstack((params, z0)) if con_iniciales else params
+    cotas = np.array([rangos[nombre] for nombre in rangos]).T
+    arranques = np.clip(arranques, cotas[0], cotas[1])
+
+    trabajos = [(objetivo, x0, cotas) for x0 in arranques]
+    if procesos == 1:
+        resultados = [_ajustar(trabajo) for trabajo in trabajos]
+    else:
+        with Pool(procesos) as grupo:
+            resultados = grupo.map(_ajustar, trabajos)
+
+    mejor = min(resultados, key=lambda resultado: resultado.cost)
+    return Calibracion(mejor.x[:7], mejor.x[7:] if con_iniciales else np.asarray(iniciales, dtype=float),
+                       mejor.cost, np.array([resultado.cost for resultado in resultados]), mejor)
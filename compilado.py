@@ -0,0 +1,151 @@
+'''
+=============================================================
+            BACKEND COMPILADO (NUMBA) DE LOS MÉTODOS
+=============================================================
+
+Versiones compiladas a código de máquina del sistema SEIRP y de los ciclos de
+paso fijo de logica.py. Se usan con solve(method, params, range, backend='numba').
+
+Los artefactos compilados se guardan en disco (cache=True, dentro de
+__pycache__), así que sólo la primera ejecución paga la compilación.
+Si numba no está instalado, METODOS queda vacío y logica.solve usa el
+backend de numpy sin avisar.
+'''
+
+import numpy as np
+
+import logica
+
+try:
+    from numba import njit
+
+    DISPONIBLE = True
+except ImportError:
+    DISPONIBLE = False
+
+
+    def njit(*args, **kwargs):
+        return lambda funcion: funcion
+
+
+# Sistema de ecuaciones F1..F5 con los parámetros en un arreglo p de 7 floats
+# (k, a_i, a_e, y, b, rho, mu).
+@njit(cache=True)
+def _rhs(z, p):
+    k, a_i, a_e, y, b, rho, mu = p[0], p[1], p[2], p[3], p[4], p[5], p[6]
+    s, e, i, r = z[0], z[1], z[2], z[3]
+    contagio = a_e * s * e + a_i * s * i
+    dz = np.empty(5)
+    dz[0] = y * r - contagio
+    dz[1] = contagio - (k + rho) * e
+    dz[2] = k * e - (b + mu) * i
+    dz[3] = b * i + rho * e - y * r
+    dz[4] = mu * i
+    return dz
+
+
+# Jacobiana analítica, igual que logica.jacobiana.
+@njit(cache=True)
+def _jacobiana(z, p):
+    k, a_i, a_e, y, b, rho, mu = p[0], p[1], p[2], p[3], p[4], p[5], p[6]
+    s, e, i = z[0], z[1], z[2]
+    J = np.zeros((5, 5))
+    fuerza = a_e * e + a_i * i
+    J[0, 0], J[0, 1], J[0, 2], J[0, 3] = -fuerza, -a_e * s, -a_i * s, y
+    J[1, 0], J[1, 1], J[1, 2] = fuerza, a_e * s - k - rho, a_i * s
+    J[2, 1], J[2, 2] = k, -b - mu
+    J[3, 1], J[3, 2], J[3, 3] = rho, b, -y
+    J[4, 2] = mu
+    return J
+
+
+# Ciclos de paso fijo: llenan in situ la matriz z (5, T) cuya primera columna
+# ya tiene las condiciones iniciales.
+@njit(cache=True)
+def _euler_forward(z, time, p):
+    y = z[:, 0].copy()
+    for it in range(1, time.shape[0]):
+        y = y + (time[it] - time[it - 1]) * _rhs(y, p)
+        z[:, it] = y
+
+
+@njit(cache=True)
+def _runge_2(z, time, p):
+    y = z[:, 0].copy()
+    for it in range(1, time.shape[0]):
+        h = time[it] - time[it - 1]
+        k1 = _rhs(y, p)
+        k2 = _rhs(y + h * k1, p)
+        y = y + (h / 2.0) * (k1 + k2)
+        z[:, it] = y
+
+
+@njit(cache=True)
+def _runge_4(z, time, p):
+    y = z[:, 0].copy()
+    for it in range(1, time.shape[0]):
+        h = time[it] - time[it - 1]
+        k1 = _rhs(y, p)
+        k2 = _rhs(y + 0.5 * h * k1, p)
+        k3 = _rhs(y + 0.5 * h * k2, p)
+        k4 = _rhs(y + h * k3, p)
+        y = y + (h / 6.0) * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+        z[:, it] = y
+
+
+# Métodos implícitos de la familia theta con Newton completo:
+#   z[n+1] = z[n] + h * ((1 - theta) * F(z[n]) + theta * F(z[n+1]))
+# theta = 1 es Euler Backward y theta = 1/2 es Euler Modificado.
+# Devuelve el número de pasos en los que Newton no convergió.
+@njit(cache=True)
+def _theta(z, time, p, theta, tol, max_iter):
+    identidad = np.eye(5)
+    fallos = 0
+    y = z[:, 0].copy()
+    for it in range(1, time.shape[0]):
+        h = time[it] - time[it - 1]
+        fijo = y + h * (1.0 - theta) * _rhs(y, p)
+        w = y.copy()
+        convergio = False
+        for _ in range(max_iter):
+            residuo = fijo + h * theta * _rhs(w, p) - w
+            dw = np.linalg.solve(h * theta * _jacobiana(w, p) - identidad, residuo)
+            w = w - dw
+            if np.abs(dw).max() <= tol * (1.0 + np.abs(w).max()):
+                convergio = True
+                break
+        if not convergio:
+            fallos += 1
+        y = w
+        z[:, it] = y
+    return fallos
+
+
+# Envuelve un ciclo compilado con la firma de los métodos de logica:
+# metodo(params, time, z0=None) -> matriz (5, len(time)).
+def _explicito(ciclo):
+    def metodo(params, time, z0=None):
+        z = logica.init_arr(time, z0)
+        ciclo(z, np.asarray(time, dtype=float), np.asarray(params, dtype=float))
+        return z
+
+    return metodo
+
+
+def _implicito(nombre, theta):
+    def metodo(params, time, z0=None):
+        z = logica.init_arr(time, z0)
+        fallos = _theta(z, np.asarray(time, dtype=float), np.asarray(params, dtype=float), theta, 1e-10, 20)
+        logica.aviso_newton(nombre, fallos)
+        return z
+
+    return metodo
+
+
+METODOS = {
+    'Euler Forward': _explicito(_euler_forward),
+    'Euler Backward': _implicito('Euler Backward', 1.0),
+    'Euler Modified': _implicito('Euler Modified', 0.5),
+    'Runge-Kutta 2': _explicito(_runge_2),
+    'Runge-Kutta 4': _explicito(_runge_4),
+} if DISPONIBLE else {}
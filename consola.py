@@ -0,0 +1,153 @@
+'''
+=============================================================
+            EJECUCIÓN SIN INTERFAZ GRÁFICA (CONSOLA)
+=============================================================
+
+Corre el modelo en servidores sin pantalla. Nunca importa PyQt5, qt_material
+ni matplotlib, sólo logica.
+
+Uso:
+    python -m consola metodos
+    python -m consola run -m "Runge-Kutta 4" -p data/custom.sd -d 365 -o salida.npz
+    python -m consola run -b barrido.json -o salida.npz
+    python -m consola barrer -m "Euler Backward" -r k=0.02:0.2 -r a_e=0.3:1 -n 1000 -o barrido.sd
+    python -m consola barrer -m "Runge-Kutta 4" -g k=0.05,0.1 -g mu=0.01,0.02 -o barrido.sd
+
+Un archivo de barrido es un JSON de la forma:
+    {"metodos": ["Runge-Kutta 4", "Euler Backward"],
+     "dias": 365,
+     "params": [[k, a_i, a_e, y, b, rho, mu], "data/post.sd", ...],
+     "iniciales": [0.8, 0.03, 0.03, 0.04, 0.1]}
+donde "iniciales" es opcional y "params" mezcla listas y archivos .sd (de
+parámetros sueltos o de un barrido, que aportan todas sus filas).
+
+La salida es un .npz con:
+    t: malla de tiempo (T,)
+    metodos: nombres de los métodos (n_metodos,)
+    params: parámetros de cada escenario (M, 7)
+    iniciales: condiciones iniciales de cada escenario (M, 5)
+    z: soluciones (n_metodos, M, 5, T)
+    tiempos: segundos de cálculo de cada método (n_metodos,)
+    arranque: segundos de importación antes del primer cálculo
+
+El comando barrer usa barrido.py: genera los escenarios con un hipercubo
+latino (-r nombre=min:max y -n muestras) o con una malla (-g nombre=v1,v2,...),
+los resuelve en paralelo (-j procesos) y escribe un .sd (ver contenedor.py)
+con las trayectorias (M, 5, T), en float32 con --float32.
+'''
+
+import time
+
+_INICIO = time.perf_counter()
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+import contenedor
+import logica
+
+ARRANQUE = time.perf_counter() - _INICIO
+
+
+# Lee los parámetros de un archivo .sd: (7,) o (M, 7). Acepta también los
+# .sd antiguos de 7 float32.
+def leer_sd(ruta):
+    return np.atleast_2d(contenedor.leer_params(ruta))
+
+
+def leer_barrido(ruta):
+    with open(ruta) as archivo:
+        barrido = json.load(archivo)
+    params = np.vstack([leer_sd(p) if isinstance(p, str) else np.asarray(p, dtype=float) for p in barrido['params']])
+    return barrido['metodos'], barrido.get('dias', 150), params, barrido.get('iniciales')
+
+
+# Resuelve cada escenario con cada método y devuelve los arreglos de la salida.
+def correr(metodos, dias, params, iniciales=None):
+    t = np.arange(0, dias)
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    z0 = np.tile(logica.iniciales if iniciales is None else iniciales, (len(params), 1)).astype(float)
+    z = np.empty((len(metodos), len(params), 5, len(t)))
+    tiempos = np.empty(len(metodos))
+    for n, metodo in enumerate(metodos):
+        inicio = time.perf_counter()
+        z[n] = logica.solve_batch(metodo, params, z0, t)
+        tiempos[n] = time.perf_counter() - inicio
+    return {'t': t, 'metodos': np.array(metodos), 'params': params, 'iniciales': z0, 'z': z,
+            'tiempos': tiempos, 'arranque': ARRANQUE}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m consola', description='Modelo SEIRP sin interfaz gráfica.')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    comandos.add_parser('metodos', help='lista los métodos registrados')
+    run = comandos.add_parser('run', help='resuelve escenarios y guarda los resultados')
+    run.add_argument('-m', '--metodo', action='append', help='método (se puede repetir)')
+    run.add_argument('-p', '--params', action='append', help='archivo .sd (se puede repetir)')
+    run.add_argument('-d', '--dias', type=int, default=150, help='duración de la simulación')
+    run.add_argument('-b', '--barrido', help='archivo JSON de barrido')
+    run.add_argument('-o', '--salida', required=True, help='archivo .npz de salida')
+    barrer = comandos.add_parser('barrer', help='barrido de parámetros en paralelo')
+    barrer.add_argument('-m', '--metodo', required=True, help='método')
+    barrer.add_argument('-r', '--rango', action='append', default=[], help='nombre=min:max (hipercubo latino)')
+    barrer.add_argument('-n', '--muestras', type=int, default=100, help='escenarios del hipercubo latino')
+    barrer.add_argument('-g', '--malla', action='append', default=[], help='nombre=v1,v2,... (malla)')
+    barrer.add_argument('-s', '--semilla', type=int, help='semilla del hipercubo latino')
+    barrer.add_argument('-d', '--dias', type=int, default=150, help='duración de la simulación')
+    barrer.add_argument('-j', '--procesos', type=int, help='procesos (por defecto uno por núcleo)')
+    barrer.add_argument('--float32', action='store_true', help='guarda las trayectorias en float32')
+    barrer.add_argument('-o', '--salida', required=True, help='archivo .sd de salida')
+    args = parser.parse_args(argv)
+
+    if args.comando == 'metodos':
+        for nombre, metodo in logica.METODOS.items():
+            print("%-22s orden=%s implicito=%s costo=%s" % (nombre, metodo.orden, metodo.implicito, metodo.costo))
+        return 0
+
+    if args.comando == 'barrer':
+        import barrido
+        if args.metodo not in logica.METODOS:
+            parser.error('método desconocido: %s' % args.metodo)
+        if bool(args.rango) == bool(args.malla):
+            parser.error('barrer necesita --rango o --malla (no ambos)')
+        if args.rango:
+            rangos = {}
+            for texto in args.rango:
+                nombre, limites = texto.split('=')
+                rangos[nombre] = tuple(float(v) for v in limites.split(':'))
+            params, z0 = barrido.hipercubo_latino(rangos, args.muestras, args.semilla)
+        else:
+            valores = {}
+            for texto in args.malla:
+                nombre, lista = texto.split('=')
+                valores[nombre] = [float(v) for v in lista.split(',')]
+            params, z0 = barrido.malla(valores)
+        inicio = time.perf_counter()
+        barrido.barrer(args.metodo, params, z0, np.arange(0, args.dias), args.salida, args.procesos,
+                       dtype=np.float32 if args.float32 else np.float64)
+        print("%d escenarios en %.3f s" % (len(params), time.perf_counter() - inicio))
+        return 0
+
+    if args.barrido:
+        metodos, dias, params, iniciales = leer_barrido(args.barrido)
+    elif args.metodo and args.params:
+        metodos, dias, params, iniciales = args.metodo, args.dias, np.vstack([leer_sd(p) for p in args.params]), None
+    else:
+        parser.error('run necesita --barrido, o --metodo y --params')
+    for metodo in metodos:
+        if metodo not in logica.METODOS:
+            parser.error('método desconocido: %s' % metodo)
+
+    resultado = correr(metodos, dias, params, iniciales)
+    np.savez(args.salida, **resultado)
+    print("arranque: %.3f s" % ARRANQUE)
+    for metodo, segundos in zip(metodos, resultado['tiempos']):
+        print("%-22s %.3f s" % (metodo, segundos))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+'''
+=============================================================
+        ARCHIVOS .sd: PARÁMETROS Y TRAYECTORIAS EN BINARIO
+=============================================================
+
+Formato versionado para guardar soluciones del modelo, pensado para poder
+abrir barridos de millones de trayectorias con np.memmap sin cargarlos en
+memoria:
+
+    bytes 0-7     b'SEIRPSD\\0'
+    bytes 8-11    versión (uint32, little endian)
+    bytes 12-15   largo L del encabezado (uint32)
+    bytes 16-     encabezado JSON (UTF-8) de L bytes
+    ...           bloques binarios, cada uno alineado a 64 bytes
+
+El encabezado tiene el método, el dtype de las trayectorias y, para cada
+bloque ('t', 'params', 'iniciales' y, si se guardó la solución, 'z'), su
+posición, dtype y forma:
+    {"version": 1, "metodo": "Runge-Kutta 4",
+     "bloques": {"z": {"offset": 448, "dtype": "<f4", "forma": [1000, 5, 150]}, ...}}
+de modo que cualquier bloque se puede abrir a mano con
+    np.memmap(ruta, dtype, mode='r', offset=offset, shape=forma)
+
+Los .sd antiguos, que son sólo los 7 parámetros en float32 (28 bytes, como
+los escribía ndarray.tofile), se siguen pudiendo leer con leer_params.
+'''
+
+import json
+import struct
+
+import numpy as np
+
+from resultado import Solucion
+
+MAGICO = b'SEIRPSD\0'
+VERSION = 1
+ALINEACION = 64
+
+
+def _alinear(n):
+    return -(-n // ALINEACION) * ALINEACION
+
+
+# Escribe el encabezado y reserva los bloques. Devuelve el encabezado.
+# param2: bloques: {nombre: (dtype, forma)} en el orden en que se escriben.
+def _crear(ruta, metodo, bloques):
+    # El tamaño del encabezado depende de los offsets y al revés, así que se
+    # calcula con un margen fijo para los dígitos de los offsets.
+    descripcion = {nombre: {'offset': 0, 'dtype': np.dtype(dtype).str, 'forma': list(forma)}
+                   for nombre, (dtype, forma) in bloques.items()}
+    encabezado = {'version': VERSION, 'metodo': metodo, 'bloques': descripcion}
+    largo = len(json.dumps(encabezado).encode()) + 24 * len(bloques)
+    offset = _alinear(16 + largo)
+    for nombre, (dtype, forma) in bloques.items():
+        descripcion[nombre]['offset'] = offset
+        offset = _alinear(offset + np.dtype(dtype).itemsize * int(np.prod(forma)))
+    texto = json.dumps(encabezado).encode().ljust(largo)
+    with open(ruta, 'wb') as archivo:
+        archivo.write(MAGICO + struct.pack('<II', VERSION, largo) + texto)
+        archivo.truncate(offset)
+    return encabezado
+
+
+def _abrir(ruta, bloque, mode='r'):
+    return np.memmap(ruta, dtype=np.dtype(bloque['dtype']), mode=mode, offset=bloque['offset'],
+                     shape=tuple(bloque['forma']))
+
+
+# Crea un archivo para M trayectorias y devuelve el bloque z como memmap
+# escribible (M, 5, T), para llenarlo a medida que se calculan (ver barrido).
+# param5: iniciales: Matriz (M, 5).
+def crear(ruta, metodo, t, params, iniciales, dtype=np.float64):
+    t = np.asarray(t, dtype=float)
+    params = np.asarray(params, dtype=float)
+    iniciales = np.asarray(iniciales, dtype=float)
+    forma = iniciales.shape[:-1] + (5, len(t))
+    encabezado = _crear(ruta, metodo, {'t': (t.dtype, t.shape), 'params': (params.dtype, params.shape),
+                                       'iniciales': (iniciales.dtype, iniciales.shape), 'z': (dtype, forma)})
+    bloques = encabezado['bloques']
+    for nombre, arreglo in (('t', t), ('params', params), ('iniciales', iniciales)):
+        _abrir(ruta, bloques[nombre], 'r+')[...] = arreglo
+    return _abrir(ruta, bloques['z'], 'r+')
+
+
+# Guarda una Solucion (o sólo los parámetros, con solucion=None).
+# param3: iniciales: Condiciones iniciales; por defecto la primera columna de
+# la solución, o logica.iniciales si sólo se guardan los parámetros.
+# param4: dtype: Tipo de las trayectorias en disco (por defecto el de la solución).
+def escribir(ruta, solucion=None, params=None, iniciales=None, dtype=None, metodo=None):
+    if solucion is None:
+        import logica
+        params = np.asarray(params, dtype=float)
+        iniciales = np.asarray(logica.iniciales if iniciales is None else iniciales, dtype=float)
+        encabezado = _crear(ruta, metodo, {'params': (params.dtype, params.shape),
+                                           'iniciales': (iniciales.dtype, iniciales.shape)})
+        _abrir(ruta, encabezado['bloques']['params'], 'r+')[...] = params
+        _abrir(ruta, encabezado['bloques']['iniciales'], 'r+')[...] = iniciales
+        return
+    if iniciales is None:
+        iniciales = np.asarray(solucion.z[..., 0], dtype=float)
+    z = crear(ruta, solucion.metodo if metodo is None else metodo, solucion.t,
+              solucion.params if params is None else params, iniciales, dtype or solucion.dtype)
+    z[...] = solucion.z
+    z.flush()
+
+
+def es_antiguo(ruta):
+    with open(ruta, 'rb') as archivo:
+        return archivo.read(len(MAGICO)) != MAGICO
+
+
+def leer_encabezado(ruta):
+    with open(ruta, 'rb') as archivo:
+        if archivo.read(len(MAGICO)) != MAGICO:
+            raise ValueError("%s no es un archivo .sd con encabezado" % ruta)
+        version, largo = struct.unpack('<II', archivo.read(8))
+        if version > VERSION:
+            raise ValueError("%s tiene la versión %d del formato; se soporta hasta la %d" % (ruta, version, VERSION))
+        return json.loads(archivo.read(largo).decode())
+
+
+# Parámetros de un .sd nuevo (7,) o (M, 7), o de uno antiguo de 28 bytes.
+def leer_params(ruta):
+    if es_antiguo(ruta):
+        params = np.fromfile(ruta, dtype=np.float32)
+        if params.size != 7:
+            raise ValueError("%s no es un archivo .sd válido" % ruta)
+        # Se pasa por el texto más corto del float32 (como mostraba la interfaz)
+        # para recuperar el valor guardado: 0.4 y no 0.4000000059604645.
+        return np.array([float(str(valor)) for valor in params])
+    return np.array(_abrir(ruta, leer_encabezado(ruta)['bloques']['params']))
+
+
+# Abre la solución guardada. La trayectoria queda como memmap de sólo
+# lectura: recortarla (solucion.trayectoria(m), solucion.ventana(...)) sólo
+# lee del disco las partes que se usan.
+def leer(ruta):
+    encabezado = leer_encabezado(ruta)
+    bloques = encabezado['bloques']
+    if 'z' not in bloques:
+        raise ValueError("%s sólo tiene parámetros; use leer_params" % ruta)
+    return Solucion(_abrir(ruta, bloques['z']), np.array(_abrir(ruta, bloques['t'])),
+                    np.array(_abrir(ruta, bloques['params'])), encabezado['metodo'],
+                    metadatos={'iniciales': np.array(_abrir(ruta, bloques['iniciales'])),
+                               'version': encabezado['version'], 'ruta': ruta})
@@ -0,0 +1,245 @@
+'''
+=============================================================
+        MODELO SEIRP POR GRUPOS DE EDAD (MATRIZ DE CONTACTOS)
+=============================================================
+
+G grupos de edad con sus propios parámetros. La fuerza de contagio
+a_e s e + a_i s i de F1 y F2 supone una población homogénea; aquí cada
+grupo g se contagia de todos los grupos h según una matriz de contactos C
+(G x G):
+
+    contagio_g = s_g sum_h C[g, h] (a_e[h] e_h + a_i[h] i_h)
+    ds_g/dt = -contagio_g + y r_g
+    de_g/dt = contagio_g - k e_g - rho e_g
+    (F3, F4 y F5 no cambian)
+
+con s_g, e_g, ... las fracciones de la población del grupo g. Si todas las
+filas de C son la proporción de la población en cada grupo (homogenea) y
+los parámetros son los mismos, la suma ponderada de los grupos es la
+solución de logica.solve.
+
+El lado derecho es un producto matriz-vector (matriz-matriz para un
+conjunto de M escenarios, que numpy hace con BLAS), así que el costo por
+paso casi no depende de G. El estado es (5, G), o (5, M, G) para un
+conjunto, y las soluciones son una Solucion (G, 5, T) o (M, G, 5, T):
+solucion.trayectoria(g) es el grupo g (o el escenario m de un conjunto).
+
+    sistema = Edades(params, contactos)     # params (7,), (G, 7) o (M, G, 7)
+    solucion = solve('Runge-Kutta 4', sistema, np.arange(0, 3651.))
+
+Están todos los métodos de logica, con sus integradores genéricos
+(logica.integrar_explicito, integrar_theta, integrar_dp e integrar_auto).
+'''
+
+from time import perf_counter
+
+import numpy as np
+
+import logica
+from resultado import Solucion
+
+
+class Edades:
+    # param1: params: k, a_i, a_e, y, b, rho, mu; (7,) para todos los grupos,
+    # (G, 7) con un juego por grupo o (M, G, 7) para un conjunto de M escenarios.
+    # param2: contactos: Matriz (G, G); C[g, h] es el contacto del grupo g con el h.
+    def __init__(self, params, contactos):
+        self.C = np.ascontiguousarray(contactos, dtype=float)
+        self.G = self.C.shape[0]
+        if self.C.shape != (self.G, self.G):
+            raise ValueError("la matriz de contactos debe ser cuadrada")
+        params = np.asarray(params, dtype=float)
+        self.params = np.array(np.broadcast_to(params, params.shape[:-2] + (self.G, 7)))
+        self.columnas = tuple(np.moveaxis(self.params, -1, 0))  # (G,) o (M, G) por parámetro
+        self.M = self.params.shape[0] if self.params.ndim == 3 else None
+
+    # Escenario m de un conjunto, como un sistema de un solo escenario.
+    def miembro(self, m):
+        return Edades(self.params[m], self.C)
+
+    # Derivadas en z (5, G) o (5, M, G). Devuelve un arreglo de la misma forma.
+    def rhs(self, z):
+        k, a_i, a_e, y, b, rho, mu = self.columnas
+        s, e, i, r, p = z
+        contagio = s * ((a_e * e + a_i * i) @ self.C.T)
+        return np.array([y * r - contagio,
+                         contagio - (k + rho) * e,
+                         k * e - (b + mu) * i,
+                         b * i + rho * e - y * r,
+                         mu * i])
+
+    # Jacobiana densa (5G, 5G) en z (5, G) (un solo escenario), con las
+    # variables ordenadas por compartimento: la entrada c * G + g es el
+    # compartimento c del grupo g.
+    def jacobiana(self, z):
+        k, a_i, a_e, y, b, rho, mu = self.columnas
+        s, e, i, r, p = z
+        G = self.G
+        g = np.arange(G)
+        contacto = (a_e * e + a_i * i) @ self.C.T
+        J = np.zeros((5, G, 5, G))
+        J[0, g, 0, g] = -contacto
+        J[1, g, 0, g] = contacto
+        J[1, :, 1, :] = s[:, None] * self.C * a_e
+        J[1, :, 2, :] = s[:, None] * self.C * a_i
+        J[0, :, 1, :] = -J[1, :, 1, :]
+        J[0, :, 2, :] = -J[1, :, 2, :]
+        J[0, g, 3, g] = y
+        J[1, g, 1, g] -= k + rho
+        J[2, g, 1, g] = k
+        J[2, g, 2, g] = -b - mu
+        J[3, g, 1, g] = rho
+        J[3, g, 2, g] = b
+        J[3, g, 3, g] = -y
+        J[4, g, 2, g] = mu
+        return J.reshape(5 * G, 5 * G)
+
+
+# Contactos de una población homogénea: todas las filas son las proporciones
+# de la población en cada grupo.
+def homogenea(pesos):
+    pesos = np.asarray(pesos, dtype=float)
+    return np.tile(pesos / pesos.sum(), (len(pesos), 1))
+
+
+# Condiciones iniciales (5, G) o (5, M, G): z0 puede ser (5,), igual en
+# todos los grupos, (5, G) o (5, M, G). Por defecto logica.iniciales.
+def iniciales(sistema, z0=None):
+    z0 = np.asarray(logica.iniciales if z0 is None else z0, dtype=float)
+    forma = (5, sistema.G) if sistema.M is None else (5, sistema.M, sistema.G)
+    return np.array(np.broadcast_to(z0.reshape((5,) + (1,) * (len(forma) - 2) + (-1,)), forma))
+
+
+# -------------------------    REGISTRO DE MÉTODOS   ---------------------------
+
+# Mismo formato que logica.METODOS y regiones.METODOS: funcion(sistema, time,
+# z0=None, estado=None), que devuelve una vista (5, [M,] G, T) de un arreglo
+# contiguo ([M,] G, 5, T).
+# 'lote' tiene el significado de logica: el método integra los M escenarios
+# de un conjunto con aritmética de arreglos, sin un ciclo de Python por
+# escenario. Son los mismos métodos que en logica (los explícitos de paso
+# fijo); los demás recorren los escenarios con por_escenario.
+METODOS = {}
+
+
+def registrar(nombre):
+    metodo = logica.METODOS[nombre]
+
+    def decorador(funcion):
+        METODOS[nombre] = metodo._replace(funcion=funcion)
+        return funcion
+
+    return decorador
+
+
+# Los métodos explícitos avanzan todos los escenarios de un conjunto a la vez.
+@registrar('Euler Forward')
+def euler_forward(sistema, time, z0=None, estado=None):
+    return logica.integrar_explicito(logica.paso_euler, sistema.rhs, time, iniciales(sistema, z0),
+                                     logica.estadisticas_de(estado))
+
+
+@registrar('Runge-Kutta 2')
+def runge_2(sistema, time, z0=None, estado=None):
+    return logica.integrar_explicito(logica.paso_rk2, sistema.rhs, time, iniciales(sistema, z0),
+                                     logica.estadisticas_de(estado), 2)
+
+
+@registrar('Runge-Kutta 4')
+def runge_4(sistema, time, z0=None, estado=None):
+    return logica.integrar_explicito(logica.paso_rk4, sistema.rhs, time, iniciales(sistema, z0),
+                                     logica.estadisticas_de(estado), 4)
+
+
+# Los demás resuelven un escenario a la vez y recorren los de un conjunto:
+# la jacobiana de 5G x 5G es de un escenario, y el paso adaptativo de
+# Dormand-Prince y la elección de Auto dependen de cada trayectoria.
+def por_escenario(metodo):
+    def funcion(sistema, time, z0=None, estado=None, **opciones):
+        if sistema.M is None:
+            return metodo(sistema, time, iniciales(sistema, z0), estado=estado, **opciones)
+        z0 = iniciales(sistema, z0)
+        z = logica.init_arr(time, z0)
+        for m in range(sistema.M):
+            # El estado de newton (o el paso) es de cada escenario; sólo se
+            # comparten las estadísticas. Las elecciones de Auto quedan en
+            # estado['eleccion'] como una lista por escenario.
+            parcial = None if estado is None else {'estadisticas': logica.estadisticas_de(estado)}
+            z[:, m] = metodo(sistema.miembro(m), time, z0[:, m], estado=parcial, **opciones)
+            if parcial is not None and 'eleccion' in parcial:
+                estado.setdefault('eleccion', []).append(parcial['eleccion'])
+        return z
+
+    return funcion
+
+
+@registrar('Euler Backward')
+@por_escenario
+def euler_backward(sistema, time, z0, estado=None):
+    return logica.integrar_theta('Euler Backward', 1.0, sistema.rhs, sistema.jacobiana, time, z0, estado)
+
+
+@registrar('Euler Modified')
+@por_escenario
+def euler_modified(sistema, time, z0, estado=None):
+    return logica.integrar_theta('Euler Modified', 0.5, sistema.rhs, sistema.jacobiana, time, z0, estado)
+
+
+# odeint (LSODA) con la jacobiana analítica, que aquí es densa y pequeña.
+@registrar('odeint/ivp-solve')
+@por_escenario
+def odeint_s(sistema, time, z0, estado=None):
+    from scipy.integrate import odeint
+    forma = z0.shape
+    z = logica.init_arr(time, z0)
+    inicio = perf_counter()
+    y, info = odeint(lambda w, t: sistema.rhs(w.reshape(forma)).ravel(), z0.ravel(), time,
+                     Dfun=lambda w, t: sistema.jacobiana(w.reshape(forma)), full_output=True)
+    estadisticas = logica.estadisticas_de(estado)
+    if estadisticas is not None and len(time) > 1:  # con un solo punto no hay contadores
+        estadisticas.tiempo += perf_counter() - inicio
+        estadisticas.evaluaciones += int(info['nfe'][-1])
+        estadisticas.jacobianas += int(info['nje'][-1])
+        estadisticas.pasos += int(info['nst'][-1])
+        estadisticas.fallos += info['message'] != 'Integration successful.'
+    z[...] = y.T.reshape(forma + (len(time),))
+    return z
+
+
+@registrar('Dormand-Prince 5(4)')
+@por_escenario
+def dormand_prince(sistema, time, z0, rtol=1e-6, atol=1e-9, h0=None, estado=None):
+    return logica.integrar_dp(sistema.rhs, time, z0, rtol, atol, h0, estado)
+
+
+# Elige entre RK4 y BDF con el espectro de la jacobiana densa (ver logica.auto).
+@registrar('Auto')
+@por_escenario
+def auto(sistema, time, z0, cada=None, estado=None):
+    return logica.integrar_auto(sistema.rhs, sistema.jacobiana, time, z0, cada, estado)
+
+
+# Resuelve el sistema por edades con un método registrado en METODOS.
+# param1: method: Nombre del método (los mismos de logica).
+# param2: sistema: Edades.
+# param3: range: Malla de tiempo con T puntos.
+# param4: z0: Condiciones iniciales (5,), (5, G) o (5, M, G).
+# Devuelve una Solucion (G, 5, T), o (M, G, 5, T) para un conjunto.
+def solve(method, sistema, range, z0=None, dtype=None, **opciones):
+    if method not in METODOS:
+        raise KeyError("%s no está disponible por edades; use uno de: %s" % (method, ', '.join(METODOS)))
+    estado = opciones.pop('estado', None)
+    if estado is None:
+        estado = {}
+    z = METODOS[method].funcion(sistema, range, z0, estado=estado, **opciones)
+    return Solucion(np.moveaxis(z, 0, -2), range, sistema.params, method, dtype, estado.get('estadisticas'),
+                    {'grupos': sistema.G, 'contactos': sistema.C, 'opciones': opciones})
+
+
+# Población completa: promedio de los grupos ponderado por su tamaño, como
+# una Solucion (5, T), o (M, 5, T) para un conjunto.
+# param2: pesos: Población (o proporción) de cada grupo (G,).
+def total(solucion, pesos):
+    pesos = np.asarray(pesos, dtype=float)
+    z = np.einsum('g,...gct->...ct', pesos / pesos.sum(), solucion.z)
+    return Solucion(z, solucion.t, None, solucion.metodo, metadatos=solucion.metadatos)
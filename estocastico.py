@@ -0,0 +1,286 @@
+'''
+=============================================================
+            SIMULACIÓN ESTOCÁSTICA DEL MODELO SEIRP
+=============================================================
+
+Versión estocástica de las mismas transiciones de logica.py, para
+poblaciones de N individuos (conteos enteros en vez de fracciones):
+
+    S -> E    a_e S E / N + a_i S I / N      (contagio)
+    E -> I    k E
+    E -> R    rho E
+    I -> R    b I
+    I -> P    mu I
+    R -> S    y R
+
+Con N grande el promedio de las realizaciones, dividido por N, se acerca a
+la solución de logica.solve con los mismos parámetros.
+
+Hay dos motores, ambos vectorizados sobre M realizaciones a la vez:
+    gillespie: algoritmo directo de Gillespie (SSA), exacto, con un evento
+    por iteración; para poblaciones pequeñas.
+    tau_leaping: avanza con pasos fijos tau y saca cuántos individuos salen
+    de cada compartimento con binomiales, así que nunca quedan conteos
+    negativos; su costo no depende de N.
+
+simular reparte las realizaciones en bloques entre procesos y junta las
+bandas de cuantiles con histogramas que se pueden sumar (Histograma), sin
+guardar todas las trayectorias. Cada bloque tiene su propia semilla
+(SeedSequence.spawn), así que el resultado es el mismo con cualquier número
+de procesos.
+'''
+
+import os
+from collections import namedtuple
+from multiprocessing import Pool
+
+import numpy as np
+
+import logica
+from resultado import Solucion
+
+# Cambio en (S, E, I, R, P) de cada transición, en el orden de propensiones.
+ESTEQUIOMETRIA = np.array([[-1, 1, 0, 0, 0],
+                           [0, -1, 1, 0, 0],
+                           [0, -1, 0, 1, 0],
+                           [0, 0, -1, 1, 0],
+                           [0, 0, -1, 0, 1],
+                           [1, 0, 0, -1, 0]])
+
+# Con 'auto', poblaciones de hasta este tamaño se simulan con gillespie.
+LIMITE_SSA = 5000
+
+# niveles: cuantiles pedidos; cuantiles: Solucion (Q, 5, T) en fracciones de
+# N; media: Solucion (5, T); histograma: el Histograma acumulado.
+Bandas = namedtuple('Bandas', 'niveles cuantiles media histograma')
+
+
+# Tasas de las seis transiciones.
+# param1: X: Conteos con las filas S, E, I, R, P; de forma (5, M).
+# param2: params: k, a_i, a_e, y, b, rho, mu; escalares o arreglos (M,).
+# param3: N: Tamaño de la población.
+# Devuelve una matriz (6, M).
+def propensiones(X, params, N):
+    k, a_i, a_e, y, b, rho, mu = params
+    S, E, I, R, P = X
+    return np.array([(a_e * E + a_i * I) * S / N, k * E, rho * E, b * I, mu * I, y * R], dtype=float)
+
+
+# Conteos iniciales (5, M) a partir de fracciones.
+def conteos_iniciales(z0, N, realizaciones):
+    z0 = np.asarray(logica.iniciales if z0 is None else z0, dtype=float)
+    X0 = np.rint(z0 * N).astype(np.int64)
+    return np.array(np.broadcast_to(X0.T if X0.ndim == 2 else X0[:, None], (5, realizaciones)))
+
+
+# Parámetros como matriz (7, M): un juego por realización.
+def _por_realizacion(params, realizaciones):
+    return np.broadcast_to(np.asarray(params, dtype=float), (realizaciones, 7)).T
+
+
+def _generador(rng):
+    return rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+
+
+# GILLESPIE:
+# Algoritmo directo: en cada iteración todas las realizaciones que no han
+# llegado al final de la malla sortean el tiempo hasta el siguiente evento y
+# cuál ocurre. El estado se registra en los puntos de la malla que quedan
+# antes del evento.
+# param1: params: (7,) o (M, 7).
+# param2: time: Malla de tiempo con T puntos.
+# param3: N: Tamaño de la población.
+# param4: z0: Fracciones iniciales (5,) o (M, 5); por defecto logica.iniciales.
+# param5: realizaciones: M.
+# param6: rng: np.random.Generator o semilla.
+# Devuelve una Solucion con los conteos (M, 5, T).
+def gillespie(params, time, N, z0=None, realizaciones=1, rng=None):
+    rng = _generador(rng)
+    time = np.asarray(time, dtype=float)
+    T = len(time)
+    P = _por_realizacion(params, realizaciones)
+    X = conteos_iniciales(z0, N, realizaciones)
+    z = np.empty((realizaciones, 5, T), dtype=np.int64)
+    t = np.full(realizaciones, time[0])
+    siguiente = np.zeros(realizaciones, dtype=np.int64)  # próximo punto de la malla por registrar
+    activas = np.arange(realizaciones)
+    while len(activas):
+        a = propensiones(X[:, activas], P[:, activas], N)
+        a0 = a.sum(axis=0)
+        with np.errstate(divide='ignore'):
+            t_nuevo = t[activas] + rng.standard_exponential(len(activas)) / a0
+
+        # El estado actual vale en [t, t_nuevo): se copia a esos puntos.
+        fin = np.searchsorted(time, t_nuevo, 'left')
+        cuantos = fin - siguiente[activas]
+        filas = np.repeat(activas, cuantos)
+        columnas = np.arange(cuantos.sum()) + np.repeat(siguiente[activas] - np.cumsum(cuantos) + cuantos, cuantos)
+        z[filas, :, columnas] = X[:, filas].T
+        siguiente[activas] = fin
+        t[activas] = t_nuevo
+
+        u = rng.random(len(activas)) * a0
+        evento = np.minimum((np.cumsum(a, axis=0) < u).sum(axis=0), len(ESTEQUIOMETRIA) - 1)
+        X[:, activas] += ESTEQUIOMETRIA[evento].T * (a0 > 0)
+        activas = activas[fin < T]
+    return Solucion(z, time, params, NOMBRES['gillespie'], metadatos={'poblacion': N})
+
+
+# Fracción a / (a + b), con 0 cuando ambas tasas son nulas.
+def _fraccion(a, b):
+    total = a + b
+    return np.divide(a, total, out=np.zeros(np.broadcast(a, b).shape), where=total > 0)
+
+
+# TAU-LEAPING:
+# Pasos fijos de tamaño tau (ajustado para caer en cada punto de la malla).
+# En cada paso, de un compartimento con X individuos y tasa total de salida
+# lambda salen Binomial(X, 1 - exp(-lambda tau)), que se reparten entre los
+# destinos en proporción a sus tasas.
+# param7: tau: Paso máximo; por defecto logica.h.
+# Devuelve una Solucion con los conteos (M, 5, T).
+def tau_leaping(params, time, N, z0=None, realizaciones=1, rng=None, tau=None):
+    rng = _generador(rng)
+    time = np.asarray(time, dtype=float)
+    tau = logica.h if tau is None else tau
+    k, a_i, a_e, y, b, rho, mu = _por_realizacion(params, realizaciones)
+    salida_e, salida_i = k + rho, b + mu
+    hacia_i, hacia_r = _fraccion(k, rho), _fraccion(b, mu)
+    S, E, I, R, P = conteos_iniciales(z0, N, realizaciones)
+    z = np.empty((realizaciones, 5, len(time)), dtype=np.int64)
+    z[:, :, 0] = np.array([S, E, I, R, P]).T
+    for j in range(1, len(time)):
+        pasos = max(1, int(np.ceil((time[j] - time[j - 1]) / tau - 1e-9)))
+        d = (time[j] - time[j - 1]) / pasos
+        for _ in range(pasos):
+            contagios = rng.binomial(S, -np.expm1(-(a_e * E + a_i * I) / N * d))
+            salen_e = rng.binomial(E, -np.expm1(-salida_e * d))
+            e_i = rng.binomial(salen_e, hacia_i)
+            salen_i = rng.binomial(I, -np.expm1(-salida_i * d))
+            i_r = rng.binomial(salen_i, hacia_r)
+            r_s = rng.binomial(R, -np.expm1(-y * d))
+            S = S - contagios + r_s
+            E = E + contagios - salen_e
+            I = I + e_i - salen_i
+            R = R + (salen_e - e_i) + i_r - r_s
+            P = P + (salen_i - i_r)
+        z[:, :, j] = np.array([S, E, I, R, P]).T
+    return Solucion(z, time, params, NOMBRES['tau'], metadatos={'poblacion': N, 'tau': tau})
+
+
+MOTORES = {'gillespie': gillespie, 'tau': tau_leaping}
+NOMBRES = {'gillespie': 'Gillespie', 'tau': 'Tau-leaping'}
+
+
+# Histograma de los conteos de cada compartimento en cada punto de la malla,
+# acumulado sobre realizaciones. Dos histogramas de la misma población y
+# malla se suman con unir, en cualquier orden, y el resultado es exacto.
+# param1: N: Tamaño de la población; los conteos van de 0 a N.
+# param2: puntos: Número de puntos T de la malla.
+# param3: clases: Número de clases (por defecto N + 1, hasta 1024). Con N + 1
+# clases hay una por conteo y los cuantiles son exactos; con menos, las clases
+# son logarítmicas (de log(1 + x)), de modo que el error relativo es el mismo
+# para compartimentos de pocos individuos y de muchos: a lo sumo
+# log(1 + N) / (2 clases), 0.7 % con N = 10^6 y 1024 clases.
+# Usa 5 * T * clases enteros de memoria.
+class Histograma:
+    def __init__(self, N, puntos, clases=None):
+        self.N = N
+        self.clases = min(N + 1, 1024) if clases is None else clases
+        self.exacto = self.clases >= N + 1
+        self.ancho = np.log1p(N) / self.clases
+        self.conteos = np.zeros((5, puntos, self.clases), dtype=np.int64)
+        self.suma = np.zeros((5, puntos), dtype=np.int64)
+        self.realizaciones = 0
+
+    def _clase(self, X):
+        if self.exacto:
+            return X
+        return np.minimum((np.log1p(X) / self.ancho).astype(np.int64), self.clases - 1)
+
+    # param1: X: Conteos (M, 5, T).
+    def agregar(self, X):
+        X = np.asarray(X)
+        celdas = np.arange(self.conteos.shape[0] * self.conteos.shape[1]).reshape(1, 5, -1) * self.clases
+        indices = (celdas + self._clase(X)).ravel()
+        self.conteos += np.bincount(indices, minlength=self.conteos.size).reshape(self.conteos.shape)
+        self.suma += X.sum(axis=0)
+        self.realizaciones += len(X)
+
+    def unir(self, otro):
+        if otro.conteos.shape != self.conteos.shape or otro.N != self.N:
+            raise ValueError("los histogramas no tienen la misma población, malla y clases")
+        self.conteos += otro.conteos
+        self.suma += otro.suma
+        self.realizaciones += otro.realizaciones
+        return self
+
+    def media(self):
+        return self.suma / self.realizaciones
+
+    # Cuantiles (en conteos) de cada compartimento en cada punto: el menor
+    # valor x con al menos q * M realizaciones <= x (el centro de su clase
+    # si no son exactas). Devuelve (Q, 5, T).
+    def cuantiles(self, niveles):
+        acumulado = np.cumsum(self.conteos, axis=-1)
+        resultado = []
+        for q in niveles:
+            objetivo = max(1, int(np.ceil(q * self.realizaciones)))
+            clase = (acumulado < objetivo).sum(axis=-1)
+            resultado.append(clase if self.exacto else np.expm1((clase + 0.5) * self.ancho))
+        return np.array(resultado, dtype=float)
+
+
+def _elegir(metodo, N):
+    if metodo == 'auto':
+        return 'gillespie' if N <= LIMITE_SSA else 'tau'
+    if metodo not in MOTORES:
+        raise ValueError("método estocástico desconocido: %s" % metodo)
+    return metodo
+
+
+# Trabajo de un proceso: simula un bloque y devuelve sólo su histograma.
+def _simular_bloque(trabajo):
+    metodo, params, time, N, z0, realizaciones, semilla, clases, opciones = trabajo
+    X = MOTORES[metodo](params, time, N, z0, realizaciones, np.random.default_rng(semilla), **opciones).z
+    histograma = Histograma(N, len(time), clases)
+    histograma.agregar(X)
+    return histograma
+
+
+# Simula muchas realizaciones y devuelve sus bandas de cuantiles (Bandas).
+# param1: params: k, a_i, a_e, y, b, rho, mu.
+# param2: time: Malla de tiempo.
+# param3: N: Tamaño de la población.
+# param4: realizaciones: Número total de realizaciones.
+# param5: metodo: 'gillespie', 'tau' o 'auto' (gillespie hasta LIMITE_SSA).
+# param6: semilla: Semilla de la SeedSequence de la que salen las de cada bloque.
+# param7: procesos: Procesos (por defecto uno por núcleo; 1 para no usar Pool).
+# param8: bloque: Realizaciones por unidad de trabajo. Con la misma semilla y
+# el mismo bloque el resultado no depende de procesos.
+# param9: niveles: Cuantiles que se calculan.
+# Las demás opciones (tau) se pasan al motor.
+def simular(params, time, N, realizaciones=1000, metodo='auto', z0=None, semilla=None, procesos=None,
+            bloque=250, niveles=(0.05, 0.25, 0.5, 0.75, 0.95), clases=None, **opciones):
+    metodo = _elegir(metodo, N)
+    time = np.asarray(time, dtype=float)
+    tamaños = [min(bloque, realizaciones - inicio) for inicio in range(0, realizaciones, bloque)]
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamaños))
+    trabajos = [(metodo, params, time, N, z0, tamaño, semilla_bloque, clases, opciones)
+                for tamaño, semilla_bloque in zip(tamaños, semillas)]
+
+    histograma = Histograma(N, len(time), clases)
+    if procesos == 1 or len(trabajos) == 1:
+        for trabajo in trabajos:
+            histograma.unir(_simular_bloque(trabajo))
+    else:
+        with Pool(min(procesos or os.cpu_count(), len(trabajos))) as grupo:
+            for parcial in grupo.imap_unordered(_simular_bloque, trabajos):
+                histograma.unir(parcial)
+
+    nombre = NOMBRES[metodo]
+    metadatos = {'poblacion': N, 'realizaciones': realizaciones, 'semilla': semilla}
+    cuantiles = Solucion(histograma.cuantiles(niveles) / N, time, params, nombre,
+                         metadatos=dict(metadatos, niveles=tuple(niveles)))
+    media = Solucion(histograma.media() / N, time, params, nombre, metadatos=metadatos)
+    return Bandas(tuple(niveles), cuantiles, media, histograma)
@@ -7,7 +7,10 @@ import numpy as np
 matplotlib.use('Qt5Agg')
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-from logica import solve
+from logica import solve, extend
+from cache import CacheSoluciones
+from resultado import Solucion
+import contenedor
 
 
 # Canvas de graficas
@@ -26,42 +29,183 @@ class MyMplCanvas(FigureCanvas):
         pass
 
 
+# Señales de un cálculo en segundo plano. Todas llevan el número de trabajo
+# para que el canvas descarte las de cálculos que ya no son el último.
+class SenalesCalculo(QtCore.QObject):
+    progreso = QtCore.pyqtSignal(int, int)
+    parcial = QtCore.pyqtSignal(int, object)
+    terminado = QtCore.pyqtSignal(int, object)
+    fallo = QtCore.pyqtSignal(int, str)
+
+
+# Integra el modelo fuera del hilo de la interfaz. Avanza por bloques de días
+# (con extend), y después de cada bloque emite el avance y la solución
+# parcial y revisa si fue cancelado.
+class CalculoModelo(QtCore.QRunnable):
+    def __init__(self, trabajo, method, params, x_range, z_prev=None, estado=None):
+        super(CalculoModelo, self).__init__()
+        self.trabajo = trabajo
+        self.method = method
+        self.params = params
+        self.x_range = x_range
+        self.z_prev = z_prev
+        self.estado = {} if estado is None else estado
+        self.cancelado = False
+        self.senales = SenalesCalculo()
+
+    def cancelar(self):
+        self.cancelado = True
+
+    def run(self):
+        try:
+            total = len(self.x_range)
+            # A lo sumo ~20 bloques, para que concatenar no domine el costo.
+            bloque = max(30, total // 20)
+            z = self.z_prev
+            hecho = 0 if z is None else z.shape[-1]
+            while z is None or hecho < total:
+                if self.cancelado:
+                    return
+                fin = min(hecho + bloque, total)
+                if z is None:
+                    z = solve(self.method, self.params, self.x_range[:fin], estado=self.estado)
+                else:
+                    z = extend(self.method, self.params, z, self.x_range[:fin], estado=self.estado)
+                hecho = fin
+                self.senales.progreso.emit(self.trabajo, 100 * hecho // total)
+                if hecho < total:
+                    self.senales.parcial.emit(self.trabajo, z)
+            self.senales.terminado.emit(self.trabajo, z)
+        except Exception as error:
+            self.senales.fallo.emit(self.trabajo, str(error))
+
+
 class MyDynamicMplCanvas(MyMplCanvas):
-    """A canvas that updates itself every second with a new plot."""
+    """A canvas that plots the current solution, computed in the background."""
+    progreso = QtCore.pyqtSignal(str)
+
     def __init__(self, *args, **kwargs):
         MyMplCanvas.__init__(self, *args, **kwargs)
-        timer = QtCore.QTimer(self)
-        timer.timeout.connect(self.update_figure)
+        # Los resultados parciales se acumulan y se dibujan como mucho cada 100 ms.
+        self.redibujo = QtCore.QTimer(self)
+        self.redibujo.setSingleShot(True)
+        self.redibujo.setInterval(100)
+        self.redibujo.timeout.connect(self.redibujar)
         self.axes.set_xlabel('Days')
         self.axes.set_ylabel('Population Radio')
         self.axes.set_title('Method')
-        self.cur_sol = solve("odeint/ivp-solve", [0, 0, 0, 0, 0, 0, 0], np.arange(0,150))
+        self.lineas = [self.axes.plot([], [], label=nombre, visible=False)[0]
+                       for nombre in ("s(t)", "e(t)", "i(t)", "r(t)", "p(t)")]
+        # Volver a un método o a unos parámetros ya calculados no recalcula.
+        self.cache = CacheSoluciones()
+        self.cur_estado = {}
+        self.cur_sol = self.cache.solve("odeint/ivp-solve", [0, 0, 0, 0, 0, 0, 0], np.arange(0,150))
+        self.sol_completa = self.cur_sol
         self.cur_meth="odeint/ivp-solve"
+        self.cur_params = [0, 0, 0, 0, 0, 0, 0]
+        self.cur_vars = [False] * 5
+        self.cur_max = 150
+        self.trabajo = 0
+        self.calculo = None
 
     def solve_model(self, method, params, max):
         x_range = np.arange(0, max)
-        self.cur_meth = method
-        self.cur_sol = solve(method, params, x_range)
+        self.cancelar_calculo()
+        if method == self.cur_meth and list(params) == self.cur_params:
+            # Sólo cambió la duración: se recorta la solución o se integra la
+            # cola. Si el cálculo anterior no terminó (cancelado o con error) se
+            # retoma desde lo que alcanzó a calcular, con un estado nuevo.
+            completa = self.sol_completa is not None
+            z_prev = self.sol_completa if completa else self.cur_sol
+            if len(x_range) <= z_prev.shape[-1]:
+                self.cur_sol = extend(method, params, z_prev, x_range)
+                if not completa:
+                    self.sol_completa, self.cur_estado = self.cur_sol, {}
+                return
+            estado = dict(self.cur_estado) if completa else {}
+            if z_prev.shape[-1] == 0:
+                z_prev = None
+        else:
+            self.cur_meth = method
+            self.cur_params = list(params)
+            self.cur_estado = {}
+            z = self.cache.consultar(method, params, x_range)
+            if z is not None:
+                self.cur_sol = self.sol_completa = z
+                return
+            z_prev, estado = None, {}
+            # sol_completa queda en None hasta que el cálculo termine.
+            self.cur_sol = Solucion(np.zeros((5, 0)), x_range[:0], params, method)
+            self.sol_completa = None
+        self.calculo = CalculoModelo(self.trabajo, method, params, x_range, z_prev, estado)
+        self.calculo.senales.progreso.connect(self.calculo_progreso)
+        self.calculo.senales.parcial.connect(self.calculo_parcial)
+        self.calculo.senales.terminado.connect(self.calculo_terminado)
+        self.calculo.senales.fallo.connect(self.calculo_fallo)
+        QtCore.QThreadPool.globalInstance().start(self.calculo)
+
+    # Cancela el cálculo en curso; sus señales pendientes se ignoran porque
+    # cambia el número de trabajo.
+    def cancelar_calculo(self):
+        if self.calculo is not None:
+            self.calculo.cancelar()
+            self.calculo = None
+        self.trabajo += 1
 
+    def calculo_progreso(self, trabajo, porcentaje):
+        if trabajo == self.trabajo:
+            self.progreso.emit("%s: %d%%" % (self.cur_meth, porcentaje))
+
+    def calculo_parcial(self, trabajo, z):
+        if trabajo == self.trabajo:
+            self.cur_sol = z
+            if not self.redibujo.isActive():
+                self.redibujo.start()
+
+    def calculo_terminado(self, trabajo, z):
+        if trabajo != self.trabajo:
+            return
+        self.cur_sol = self.sol_completa = z
+        self.cur_estado = self.calculo.estado
+        self.cache.guardar(self.cur_meth, self.cur_params, self.calculo.x_range, z)
+        self.calculo = None
+        self.redibujo.stop()
+        self.redibujar()
+        if self.cur_estado.get('eleccion'):
+            self.progreso.emit("Auto: " + "; ".join("%s en [%g, %g] (%s)" % (e.metodo, e.t_inicio, e.t_fin, e.motivo)
+                                                    for e in self.cur_estado['eleccion']))
+
+    def calculo_fallo(self, trabajo, mensaje):
+        if trabajo == self.trabajo:
+            # cur_sol se queda con lo último calculado, que se retoma al volver a pedirlo.
+            self.calculo = None
+            self.sol_completa = None
+            self.progreso.emit("%s: %s" % (self.cur_meth, mensaje))
+
+    def redibujar(self):
+        self.update_figure(self.cur_vars, self.cur_max)
+
+    # Las líneas se crean una sola vez; al cambiar la solución o las variables
+    # marcadas sólo se actualizan sus datos y su visibilidad, y se pide un
+    # redibujo diferido (draw_idle) en lugar de reconstruir la figura.
     def update_figure(self, variables, max):
-        x_range = np.arange(0, max)
-        s, e, i, r, p = self.cur_sol
-        self.axes.clear()
-        if variables[0]:
-            self.axes.plot(x_range, s, label="s(t)")
-        if variables[1]:
-            self.axes.plot(x_range, e, label="e(t)")
-        if variables[2]:
-            self.axes.plot(x_range, i, label="i(t)")
-        if variables[3]:
-            self.axes.plot(x_range, r, label="r(t)")
-        if variables[4]:
-            self.axes.plot(x_range, p, label="p(t)")
-        self.axes.set_xlabel('Days')
-        self.axes.set_ylabel('Population Radio')
-        self.axes.legend()
+        self.cur_vars = variables
+        self.cur_max = max
+        # Mientras se calcula, la solución puede cubrir sólo parte de los días.
+        n = min(len(np.arange(0, max)), self.cur_sol.shape[-1])
+        x_range = np.arange(0, max)[:n]
+        for linea, visible, y in zip(self.lineas, variables, self.cur_sol[:, :n]):
+            linea.set_data(x_range, y)
+            linea.set_visible(bool(visible))
+        visibles = [linea for linea in self.lineas if linea.get_visible()]
+        if visibles:
+            self.axes.legend(handles=visibles)
+        elif self.axes.get_legend() is not None:
+            self.axes.get_legend().remove()
+        self.axes.relim(visible_only=True)
+        self.axes.autoscale_view()
         self.axes.set_title(self.cur_meth)
-        self.draw()
+        self.draw_idle()
 
 
 # Diseño de la interfaz usando qt
@@ -69,7 +213,8 @@ class MyDynamicMplCanvas(MyMplCanvas):
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self):
         super(MainWindow, self).__init__()
-        self.method = ""
+        # Auto elige entre RK4 y BDF según la rigidez de los parámetros.
+        self.method = "Auto"
         self.parameteres = [0, 0, 0, 0, 0, 0, 0]
 
     def setupUi(self, ProyectoFinal):
@@ -173,6 +318,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_ivp = QtWidgets.QPushButton(self.widget_2)
         self.btn_ivp.setObjectName("btn_ivp")
         self.verticalLayout.addWidget(self.btn_ivp)
+        self.btn_auto = QtWidgets.QPushButton(self.widget_2)
+        self.btn_auto.setObjectName("btn_auto")
+        self.verticalLayout.addWidget(self.btn_auto)
         self.gridLayout_2.addLayout(self.verticalLayout, 0, 0, 1, 1)
         self.gridLayout_3.addWidget(self.widget_2, 0, 1, 1, 1)
         self.widget = QtWidgets.QWidget(self.centralwidget)
@@ -358,6 +506,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_rk_2.setText(_translate("ProyectoFinal", "Runge-Kutta 2"))
         self.btn_rk_4.setText(_translate("ProyectoFinal", "Runge-Kutta 4"))
         self.btn_ivp.setText(_translate("ProyectoFinal", "odeint/ivp-solve"))
+        self.btn_auto.setText(_translate("ProyectoFinal", "Automático"))
         self.param_s.setText(_translate("ProyectoFinal", "s(t)"))
         self.param_e.setText(_translate("ProyectoFinal", "e(t)"))
         self.param_i.setText(_translate("ProyectoFinal", "i(t)"))
@@ -395,6 +544,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.param_i.toggled.connect(lambda: self.update_plot(False))
         self.param_r.toggled.connect(lambda: self.update_plot(False))
         self.param_p.toggled.connect(lambda: self.update_plot(False))
+        self.dc.progreso.connect(lambda mensaje: self.statusbar.showMessage(mensaje, 3000))
         # metodos
         self.btn_euler_forward.clicked.connect(lambda: self.change_method("Euler Forward"))
         self.btn_euler_backward.clicked.connect(lambda: self.change_method("Euler Backward"))
@@ -402,6 +552,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_rk_2.clicked.connect(lambda: self.change_method("Runge-Kutta 2"))
         self.btn_rk_4.clicked.connect(lambda: self.change_method("Runge-Kutta 4"))
         self.btn_ivp.clicked.connect(lambda: self.change_method("odeint/ivp-solve"))
+        self.btn_auto.clicked.connect(lambda: self.change_method("Auto"))
         # parametros
         self.kLineEdit.setValidator(QtGui.QDoubleValidator(-1000.0, 1000.0, 2))
         self.kLineEdit.setValidator(QtGui.QDoubleValidator(-1000.0, 1000.0, 2))
@@ -440,7 +591,8 @@ class MainWindow(QtWidgets.QMainWindow):
         path = QtWidgets.QFileDialog.getOpenFileName(self, 'Abrir un archivo', '', 'Poputation Simulation files (*.sd)')
         if path != ('', ''):
             print("File path : " + path[0])
-            self.parameteres = np.fromfile(path[0], dtype=np.float32)
+            # Sirve tanto para los .sd antiguos (7 float32) como para los nuevos.
+            self.parameteres = np.atleast_2d(contenedor.leer_params(path[0]))[0]
             self.kLineEdit.setText(str(self.parameteres[0]))
             self.aiLineEdit.setText(str(self.parameteres[1]))
             self.aeLineEdit.setText(str(self.parameteres[2]))
@@ -462,8 +614,13 @@ class MainWindow(QtWidgets.QMainWindow):
         name = QtWidgets.QFileDialog.getSaveFileName(self, 'Exportar datos', '', 'Poputation Simulation files (*.sd)')
         if name != ('', ''):
             print(name[0])
-            data = np.array(self.parameteres, dtype=np.float32)
-            data.tofile(name[0])
+            # Si la solución en pantalla es de estos parámetros y está completa,
+            # se guarda junto con ellos; si no, sólo los parámetros.
+            if (self.dc.calculo is None and self.dc.sol_completa is not None
+                    and list(self.parameteres) == self.dc.cur_params):
+                contenedor.escribir(name[0], self.dc.cur_sol)
+            else:
+                contenedor.escribir(name[0], params=self.parameteres, metodo=self.dc.cur_meth)
 
     def update_duracion(self):
         self.sim_time.value = 32
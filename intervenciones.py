@@ -0,0 +1,250 @@
+'''
+=============================================================
+        PARÁMETROS QUE CAMBIAN EN EL TIEMPO (INTERVENCIONES)
+=============================================================
+
+Los integradores de logica usan parámetros constantes. Aquí la integración
+se parte en tramos en los que los parámetros no cambian, y cada tramo se
+resuelve con el método registrado, empezando exactamente en el instante del
+cambio (aunque no esté en la malla) con el estado final del tramo anterior:
+
+    Calendario: cambios programados, por ejemplo una cuarentena
+        Calendario(BASE, [(30, {'a_i': 0.002, 'a_e': 0.3}), (90, {'a_i': 0.005, 'a_e': 0.65})])
+    en tramos constantes o, con interpolar=True, variando linealmente entre
+    un cambio y el siguiente.
+
+    Disparador: cambio que ocurre cuando un compartimento cruza un umbral,
+        Disparador('i', 0.05, {'a_i': 0.5, 'a_e': 0.5}, factor=True)
+    ("cuando i(t) pase de 0.05, reducir a la mitad a_i y a_e"). El cruce se
+    ubica con brentq entre los dos puntos de la malla que lo encierran,
+    integrando con el mismo método desde el primero.
+
+Con un CacheTramos compartido entre llamadas, cada tramo se guarda con su
+método, parámetros, instante y estado inicial; al cambiar una intervención
+posterior se reutilizan los tramos anteriores a ella y sólo se integra desde
+ese cambio en adelante.
+
+    cache = CacheTramos()
+    a = simular('Runge-Kutta 4', calendario, np.arange(0, 366.), cache=cache)
+    b = simular('Runge-Kutta 4', otro_calendario, np.arange(0, 366.), cache=cache)
+'''
+
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+import logica
+from barrido import PARAMETROS
+from cache import CacheSoluciones
+from resultado import COMPARTIMENTOS, Solucion
+
+# tipo: 'calendario' o 'disparador'; params: los que rigen desde t.
+Evento = namedtuple('Evento', ['t', 'tipo', 'descripcion', 'params'])
+
+
+# Aplica {nombre: valor} sobre un juego de 7 parámetros.
+# param3: factor: Multiplicar por el valor en lugar de reemplazar.
+def aplicar(params, cambios, factor=False):
+    params = np.array(params, dtype=float)
+    for nombre, valor in cambios.items():
+        if nombre not in PARAMETROS:
+            raise ValueError("parámetro desconocido: %s" % nombre)
+        j = PARAMETROS.index(nombre)
+        params[j] = params[j] * valor if factor else valor
+    return params
+
+
+def _describir(cambios, factor=False):
+    return ', '.join(("%s x%g" if factor else "%s = %g") % (nombre, valor) for nombre, valor in cambios.items())
+
+
+class Calendario:
+    # param1: base: k, a_i, a_e, y, b, rho, mu antes del primer cambio.
+    # param2: cambios: Lista de (t, {nombre: valor}); los cambios se acumulan.
+    # param3: interpolar: False para tramos constantes (cada cambio rige desde
+    # su t); True para variar linealmente entre los valores de un cambio y los
+    # del siguiente. En los dos casos antes del primer cambio rige base, así
+    # que para una rampa desde base se empieza con un cambio vacío: (30, {}).
+    def __init__(self, base, cambios=(), interpolar=False):
+        self.base = np.asarray(base, dtype=float)
+        self.cambios = sorted(((float(t), dict(valores)) for t, valores in cambios), key=lambda cambio: cambio[0])
+        self.interpolar = interpolar
+        self.tiempos = np.array([t for t, valores in self.cambios])
+        tabla = [self.base]
+        for t, valores in self.cambios:
+            tabla.append(aplicar(tabla[-1], valores))
+        self.tabla = np.array(tabla)  # fila 0: base; fila j: después del cambio j
+
+    # Parámetros en el instante t.
+    def valores(self, t):
+        j = np.searchsorted(self.tiempos, t, 'right')
+        if not self.interpolar or j == 0 or j == len(self.tiempos):
+            return self.tabla[j]
+        x = (t - self.tiempos[j - 1]) / (self.tiempos[j] - self.tiempos[j - 1])
+        return (1 - x) * self.tabla[j] + x * self.tabla[j + 1]
+
+    # Instantes dentro de range en los que hay que reiniciar la integración:
+    # los de los cambios y, donde se interpola, todos los puntos de la malla.
+    def cortes(self, range):
+        cortes = self.tiempos[(self.tiempos > range[0]) & (self.tiempos < range[-1])]
+        if self.interpolar and len(self.tiempos) > 1:
+            dentro = range[(range > self.tiempos[0]) & (range < self.tiempos[-1])]
+            cortes = np.union1d(cortes, dentro)
+        return cortes
+
+    # Parámetros del tramo [t_inicio, t_fin]: constantes en los tramos, y en
+    # el punto medio cuando se interpola (con un tramo por paso de la malla,
+    # el error es de segundo orden en h).
+    def params(self, t_inicio, t_fin):
+        return self.valores(0.5 * (t_inicio + t_fin) if self.interpolar else t_inicio)
+
+
+class Disparador:
+    # param1: compartimento: 's', 'e', 'i', 'r' o 'p'.
+    # param2: umbral: Valor cuyo cruce activa el cambio.
+    # param3: cambios: {nombre: valor} que rige desde el cruce en adelante.
+    # param4: factor: Multiplicar los parámetros por los valores en lugar de reemplazarlos.
+    # param5: sube: True para cruces hacia arriba, False hacia abajo.
+    # Se activa una sola vez; si el compartimento ya está del otro lado del
+    # umbral al inicio, no se activa hasta que lo cruce.
+    def __init__(self, compartimento, umbral, cambios, factor=False, sube=True):
+        self.fila = COMPARTIMENTOS.index(compartimento)
+        self.compartimento = compartimento
+        self.umbral = umbral
+        self.cambios = dict(cambios)
+        self.factor = factor
+        self.sube = sube
+
+    def aplicar(self, params):
+        return aplicar(params, self.cambios, self.factor)
+
+    # Índice q del primer punto en que la serie cruza el umbral respecto al
+    # anterior (None si no lo cruza).
+    def cruce(self, serie):
+        if self.sube:
+            cruza = (serie[:-1] < self.umbral) & (serie[1:] >= self.umbral)
+        else:
+            cruza = (serie[:-1] > self.umbral) & (serie[1:] <= self.umbral)
+        q = np.flatnonzero(cruza)
+        return q[0] + 1 if len(q) else None
+
+    def descripcion(self):
+        return "%s %s %g: %s" % (self.compartimento, '>=' if self.sube else '<=', self.umbral,
+                                 _describir(self.cambios, self.factor))
+
+
+def _integrar(method, params, malla, z0, opciones):
+    return logica.METODOS[method].funcion(params, malla, z0=z0, **opciones)
+
+
+# Tramos ya integrados, con una política LRU por número de tramos. La clave
+# de un tramo es la de CacheSoluciones con su método, parámetros, instante y
+# estado inicial, así que el mismo tramo se reconoce aunque venga de otro
+# calendario. Si se pide un tramo guardado que termina antes (o en otros
+# puntos) se reutiliza el comienzo común y sólo se integra el resto.
+class CacheTramos:
+    def __init__(self, max_tramos=4096):
+        self.max_tramos = max_tramos
+        self.reutilizados = 0  # puntos tomados del caché
+        self.calculados = 0  # puntos integrados
+        self._datos = OrderedDict()
+
+    # Solución (5, len(malla)) del tramo que empieza en malla[0] con z0.
+    def tramo(self, method, params, malla, z0, opciones):
+        clave = CacheSoluciones.clave('tramo', method, params, malla[:1], z0, **opciones)
+        t_guardado, z_guardado = self._datos.get(clave, (malla[:1], np.asarray(z0, dtype=float)[:, None]))
+        n = min(len(malla), len(t_guardado))
+        comun = n if np.array_equal(malla[:n], t_guardado[:n]) else int(np.argmin(malla[:n] == t_guardado[:n]))
+        self.reutilizados += comun - 1
+        if comun == len(malla):
+            self._datos.move_to_end(clave)
+            return z_guardado[:, :comun]
+        resto = _integrar(method, params, malla[comun - 1:], z_guardado[:, comun - 1], opciones)
+        self.calculados += len(malla) - comun
+        z = np.concatenate((z_guardado[:, :comun], resto[:, 1:]), axis=1)
+        self._datos[clave] = (np.array(malla), z)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_tramos:
+            self._datos.popitem(last=False)
+        return z
+
+
+# Resuelve con parámetros que cambian en el tiempo.
+# param1: method: Método registrado en logica.
+# param2: calendario: Calendario (o un juego de 7 parámetros fijos).
+# param3: range: Malla de tiempo.
+# param4: z0: Condiciones iniciales (por defecto logica.iniciales).
+# param5: disparadores: Lista de Disparador. Los ya activados se aplican, en
+# el orden en que se activaron, sobre los valores del calendario.
+# param6: cache: CacheTramos para reutilizar tramos entre llamadas (None para
+# no guardar nada).
+# Las demás opciones se pasan al método en cada tramo.
+# Devuelve una Solucion (5, T); sus metadatos tienen los eventos (lista de
+# Evento, en orden) y cuántos puntos se integraron y cuántos se reutilizaron.
+def simular(method, calendario, range, z0=None, disparadores=(), cache=None, **opciones):
+    from scipy.optimize import brentq
+    if not isinstance(calendario, Calendario):
+        calendario = Calendario(calendario)
+    range = np.asarray(range, dtype=float)
+    cache = CacheTramos() if cache is None else cache
+    reutilizados, calculados = cache.reutilizados, cache.calculados
+    z = logica.init_arr(range, z0)
+    cortes = list(calendario.cortes(range)) + [range[-1]]
+    pendientes = list(disparadores)
+    activos = []
+    eventos = []
+    programados = {t: valores for t, valores in calendario.cambios if valores}
+
+    t, estado, j = range[0], z[:, 0].copy(), 1
+    while j < len(range):
+        while cortes[0] <= t:
+            cortes.pop(0)
+        t_fin = cortes[0]
+        params = calendario.params(t, t_fin)
+        for disparador in activos:
+            params = disparador.aplicar(params)
+        if t in programados and range[0] < t:
+            eventos.append(Evento(t, 'calendario', _describir(programados.pop(t)), params))
+        fin = np.searchsorted(range, t_fin, 'right')
+        malla = np.concatenate(([t], range[j:fin], [] if range[fin - 1] == t_fin else [t_fin]))
+        tramo = cache.tramo(method, params, malla, estado, opciones)
+
+        # Disparador que se activa primero en este tramo.
+        cruces = [(disparador.cruce(tramo[disparador.fila]), n) for n, disparador in enumerate(pendientes)]
+        cruces = [(q, n) for q, n in cruces if q is not None]
+        if cruces:
+            q, n = min(cruces)
+            disparador = pendientes.pop(n)
+
+            def distancia(tau):
+                if tau == malla[q - 1]:
+                    return tramo[disparador.fila, q - 1] - disparador.umbral
+                return _integrar(method, params, np.array([malla[q - 1], tau]), tramo[:, q - 1],
+                                 opciones)[disparador.fila, -1] - disparador.umbral
+
+            try:
+                t_fin = brentq(distancia, malla[q - 1], malla[q], xtol=1e-12)
+            except ValueError:
+                # Con métodos adaptativos el valor recalculado en malla[q] puede
+                # no cruzar por muy poco: se toma el punto de la malla.
+                t_fin = malla[q]
+            malla = malla[:q][malla[:q] < t_fin] if t_fin < malla[q] else malla[:q + 1]
+            if malla[-1] < t_fin:
+                final = _integrar(method, params, np.array([malla[-1], t_fin]), tramo[:, len(malla) - 1], opciones)
+                tramo = np.concatenate((tramo[:, :len(malla)], final[:, 1:]), axis=1)
+                malla = np.append(malla, t_fin)
+            else:
+                tramo = tramo[:, :len(malla)]
+            activos.append(disparador)
+            eventos.append(Evento(t_fin, 'disparador', disparador.descripcion(),
+                                  disparador.aplicar(params)))
+
+        # Los puntos del tramo que están en la malla pedida.
+        en_malla = np.isin(malla[1:], range)
+        z[:, j:j + en_malla.sum()] = tramo[:, 1:][:, en_malla]
+        j += en_malla.sum()
+        t, estado = malla[-1], tramo[:, -1].copy()
+
+    return Solucion(z, range, calendario.base, method,
+                    metadatos={'eventos': eventos, 'calculados': cache.calculados - calculados,
+                               'reutilizados': cache.reutilizados - reutilizados})
@@ -6,7 +6,7 @@
     ds(t)/dt = -a_e s(t)e(t) - a_i s(t) i(t) + 𝛾 r(t)               (F1)
     de(t)/dt = a_e s(t)e(t) + a_i s(t)i(t) - ke(t) - pe(t)          (F2)
     di(t)/dt = ke(t) - 𝛽i(t) - 𝜇i(t)                                (F3)
-    dr(t)/dt = 𝛽i(t) + 𝜌e(t) + 𝛾r(t)                                (F4)
+    dr(t)/dt = 𝛽i(t) + 𝜌e(t) - 𝛾r(t)                                (F4)
     dp(t)/dt = 𝜇i(t)                                                (F5)
 
 Con los siguientes parámetros:
@@ -28,9 +28,17 @@ r: r(t): Fracción de la población recuperada.
 p: p(t): El número de individuos que muere debido a la enfermedad.
 '''
 
+import warnings
+from collections import namedtuple
+from time import perf_counter
+
 import numpy as np
-from scipy.integrate import odeint
-import scipy.optimize as opt
+
+from resultado import Solucion
+
+# scipy.integrate y scipy.interpolate se importan dentro de las funciones que
+# los usan: importarlos aquí triplica el tiempo de arranque de quien sólo
+# necesita los métodos de paso fijo (por ejemplo consola.py).
 
 iniciales = [0.8, 0.03, 0.03, 0.04, 0.1]
 h = 0.1
@@ -53,7 +61,7 @@ def F3(e, i, k, b, mu):
 
 # Definimos la función F4 dr(t)/dt:
 def F4(i, e, r, b, rho, y):
-    return b * i + rho * e + y * r
+    return b * i + rho * e - y * r
 
 
 # Definimos la función F5 dp(t)/dt:
@@ -61,6 +69,23 @@ def F5(mu, i):
     return mu * i
 
 
+# Núcleo vectorizado: calcula las cinco derivadas (F1..F5) en una sola llamada.
+# param1: z: Estado con las filas s, e, i, r, p; de forma (5,) o (5, N).
+# param2: params: k, a_i, a_e, y, b, rho, mu. Cada uno puede ser escalar o un
+# arreglo de tamaño N (un juego de parámetros por columna de z).
+# Para un único estado se opera con floats de Python, que es bastante más
+# rápido que hacerlo con escalares de numpy.
+def rhs(z, params):
+    k, a_i, a_e, y, b, rho, mu = params
+    s, e, i, r, p = np.asarray(z).tolist() if np.ndim(z) == 1 else z
+    contagio = a_e * s * e + a_i * s * i
+    return np.array([y * r - contagio,
+                     contagio - (k + rho) * e,
+                     k * e - (b + mu) * i,
+                     b * i + rho * e - y * r,
+                     mu * i])
+
+
 '''
 ===========================================================================
                  SOLUCIÓN DEL SISTEMA DE ECUACIONES
@@ -71,244 +96,871 @@ def F5(mu, i):
 
 # --------------------   FUNCIONES AUXILIARES    --------------------------
 
-# EULER BACKWARD:
-# Función cun sistemas de EDOs, que se usará posteriormente
-# para resolver el sistema con fsolve.
-# param1: aux: Matriz que almacena los vectores de solución de la iteración actual y[i] para
-# s, e, i, r, p.
-# param1: st1: Arreglo de soluciones de la fracción de la población susceptible, en la iteración anterior.
-# param2: et1: Arreglo de soluciones de la fracción de la población expuesta, en la iteración anterior.
-# param3: it1: Arreglo de soluciones de la fracción de la población infectada, en la iteración anterior.
-# param4: rt1: Arreglo de soluciones de la fracción de la población recuperada, en la iteración anterior.
-# param5: pt1: Arreglo de soluciones del número de individuos que muere debido a la enfermedad, en la iteración anterior.
-# params: a_e, a_i, k, y, b, rho, mu.
-# param6: h:
-
-def FEulerBackRoot(aux, st1, et1, it1, rt1, pt1, a_e, a_i, k, y, b, rho, mu):
-    h = 1
-    return [st1 + h * F1(aux[0], aux[1], aux[2], aux[3], a_e, a_i, y) - aux[0],
-            et1 + h * F2(aux[0], aux[1], aux[2], a_e, a_i, k, rho) - aux[1],
-            it1 + h * F3(aux[1], aux[2], k, b, mu) - aux[2],
-            rt1 + h * F4(aux[2], aux[1], aux[3], b, rho, y) - aux[3],
-            pt1 + h * F5(aux[2], mu) - aux[4]]
-
-
-# EULER MODIFICADO:
-# Función cun sistemas de EDOs, que se usará posteriormente
-# para resolver el sistema con fsolve.
-# param1: aux: Matriz que almacena los vectores de solución de la iteración actual y[i] para
-# s, e, i, r, p.
-# param1: st1: Arreglo de soluciones de la fracción de la población susceptible, en la iteración anterior.
-# param2: et1: Arreglo de soluciones de la fracción de la población expuesta, en la iteración anterior.
-# param3: it1: Arreglo de soluciones de la fracción de la población infectada, en la iteración anterior.
-# param4: rt1: Arreglo de soluciones de la fracción de la población recuperada, en la iteración anterior.
-# param5: pt1: Arreglo de soluciones del número de individuos que muere debido a la enfermedad, en la iteración anterior.
-# params: a_e, a_i, k, y, b, rho, mu.
-# param6: h:
-
-
-def FEulerModRoot(aux, st1, et1, it1, rt1, pt1, a_e, a_i, k, y, b, rho, mu):
-    h = 1
-    return [st1 + (h / 2.0) *
-            (F1(st1, et1, it1, rt1, a_e, a_i, y) +
-             F1(aux[0], aux[1], aux[2], aux[3], a_e, a_i, y)) - aux[0],
-            et1 + (h / 2.0) *
-            (F2(st1, et1, it1, a_e, a_i, k, rho) +
-             F2(aux[0], aux[1], aux[2], a_e, a_i, k, rho)) - aux[1],
-            it1 + (h / 2.0) *
-            (F3(et1, it1, k, b, mu) +
-             F3(aux[1], aux[2], k, b, mu)) - aux[2],
-            rt1 + (h / 2.0) *
-            (F4(et1, it1, rt1, b, rho, y) +
-             F4(aux[1], aux[2], aux[3], b, rho, y)) - aux[3],
-            pt1 + (h / 2.0) *
-            (F5(it1, mu) +
-             F5(aux[2], mu)) - aux[4],
-            ]
+# Jacobiana analítica del sistema: matriz (5, 5) con J[a, b] = dF_a/dz_b,
+# donde z = (s, e, i, r, p).
+# param1: z: Estado en el que se evalúa.
+# params: k, a_i, a_e, y, b, rho, mu.
+def jacobiana(z, params):
+    k, a_i, a_e, y, b, rho, mu = params
+    s, e, i, r, p = np.asarray(z).tolist()
+    fuerza = a_e * e + a_i * i
+    return np.array([[-fuerza, -a_e * s, -a_i * s, y, 0.0],
+                     [fuerza, a_e * s - k - rho, a_i * s, 0.0, 0.0],
+                     [0.0, k, -b - mu, 0.0, 0.0],
+                     [0.0, rho, b, -y, 0.0],
+                     [0.0, 0.0, mu, 0.0, 0.0]])
+
+
+# Jacobiana respecto a los parámetros: matriz (5, 7) con J[a, b] = dF_a/dparam_b,
+# con los parámetros en el orden k, a_i, a_e, y, b, rho, mu.
+def jacobiana_parametros(z, params):
+    s, e, i, r, p = np.asarray(z).tolist()
+    return np.array([[0.0, -s * i, -s * e, r, 0.0, 0.0, 0.0],
+                     [-e, s * i, s * e, 0.0, 0.0, -e, 0.0],
+                     [e, 0.0, 0.0, 0.0, -i, 0.0, -i],
+                     [0.0, 0.0, 0.0, -r, i, e, 0.0],
+                     [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, i]])
+
+
+# Factorización para newton: devuelve una función que resuelve A x = b.
+# Para las matrices de 5x5 del modelo es más barato invertir una vez y
+# multiplicar en cada iteración que llamar a una rutina LU de scipy.
+def factorizar_densa(A):
+    return np.linalg.inv(A).dot
+
+
+# NEWTON:
+# Resuelve residuo(z) = 0 partiendo de z con un Newton simplificado: la
+# factorización de la jacobiana se reutiliza (también entre pasos de tiempo)
+# mientras la convergencia sea buena, y sólo se vuelve a calcular cuando la
+# corrección no se reduce al menos 10 veces en cada iteración.
+# param1: residuo: Función residuo(z).
+# param2: jac: Función jac(z) con la jacobiana del residuo.
+# param3: z: Aproximación inicial.
+# param4: resolver: Factorización reutilizable (None para calcularla).
+# param5: factorizar: Función que recibe la jacobiana y devuelve resolver.
+# param6: estadisticas: Estadisticas donde se guardan las iteraciones de
+# esta llamada, las factorizaciones y si no convergió (o None).
+# Devuelve (z, resolver, convergio).
+def newton(residuo, jac, z, resolver=None, factorizar=factorizar_densa, tol=1e-10, max_iter=20,
+           estadisticas=None):
+    factorizaciones = 0
+    if resolver is None:
+        resolver = factorizar(jac(z))
+        factorizaciones += 1
+    norma_ant = np.inf
+    convergio = False
+    for iteraciones in range(1, max_iter + 1):
+        dz = -resolver(residuo(z))
+        z = z + dz
+        norma = np.abs(dz).max()
+        if norma <= tol * (1.0 + np.abs(z).max()):
+            convergio = True
+            break
+        if norma > 0.1 * norma_ant:
+            resolver = factorizar(jac(z))
+            factorizaciones += 1
+        norma_ant = norma
+    if estadisticas is not None:
+        estadisticas._iteraciones.append(iteraciones)
+        if factorizaciones:
+            estadisticas.jacobianas += factorizaciones
+            estadisticas.factorizaciones += factorizaciones
+        if not convergio:
+            estadisticas.fallos += 1
+    return z, resolver, convergio
+
+
+def aviso_newton(metodo, fallos):
+    if fallos:
+        warnings.warn("%s: newton no convergió en %d pasos" % (metodo, fallos), RuntimeWarning)
+
+
+# ESTADÍSTICAS DE UNA INTEGRACIÓN:
+# Los integradores registrados las llenan cuando reciben un diccionario
+# estado: quedan en estado['estadisticas'] y se acumulan entre llamadas, así
+# que con extend cubren toda la solución. Cuestan un perf_counter y unas
+# sumas por paso, de modo que se pueden dejar siempre activas.
+# Para usar los ganchos se pone una de antemano en el estado:
+#   estado = {'estadisticas': Estadisticas(al_paso=funcion)}
+#   z = solve('Euler Backward', params, range, estado=estado)
+# param1: al_paso: Función al_paso(t, z) que se llama después de cada paso
+# aceptado (odeint y BDF de scipy no la llaman).
+# param2: al_fallo: Función al_fallo(t, z) que se llama en cada paso en el que
+# newton no convergió.
+# param3: por_paso: Guardar las iteraciones y el tiempo de cada paso. Con
+# False sólo se conservan los totales y los máximos, y la memoria no crece
+# con la duración (ver solve_por_bloques).
+class Estadisticas:
+    def __init__(self, al_paso=None, al_fallo=None, por_paso=True):
+        self.al_paso = al_paso
+        self.al_fallo = al_fallo
+        self.por_paso = por_paso
+        self.evaluaciones = 0  # llamadas a rhs (cada una evalúa F1..F5)
+        self.jacobianas = 0
+        self.factorizaciones = 0
+        self.pasos = 0
+        self.rechazos = 0  # pasos rechazados por el control de error
+        self.fallos = 0  # pasos en los que newton no convergió
+        self.tiempo = 0.0  # segundos dentro de los integradores
+        self._iteraciones = []
+        self._tiempos = []
+        # Totales de lo que ya no se guarda paso a paso (por_paso=False).
+        self._iteraciones_suma = 0
+        self._iteraciones_max = 0
+        self._tiempo_paso_max = 0.0
+
+    # Iteraciones de newton de cada paso de los métodos implícitos.
+    @property
+    def iteraciones(self):
+        return np.array(self._iteraciones, dtype=int)
+
+    # Segundos de cada paso (los métodos de scipy sólo aportan el tiempo total).
+    @property
+    def tiempo_paso(self):
+        return np.concatenate(self._tiempos) if self._tiempos else np.empty(0)
+
+    def agregar_pasos(self, tiempos, evaluaciones=0):
+        self.pasos += len(tiempos)
+        self.tiempo += float(np.sum(tiempos))
+        self.evaluaciones += evaluaciones
+        if self.por_paso:
+            self._tiempos.append(tiempos)
+            return
+        if len(tiempos):
+            self._tiempo_paso_max = max(self._tiempo_paso_max, float(np.max(tiempos)))
+        if self._iteraciones:
+            self._iteraciones_suma += sum(self._iteraciones)
+            self._iteraciones_max = max(self._iteraciones_max, max(self._iteraciones))
+            del self._iteraciones[:]
+
+    # Copia sin los datos de cada paso ni los ganchos, con los totales y los
+    # máximos como si se hubiera creado con por_paso=False.
+    def compacta(self):
+        resumen = self.resumen()
+        copia = Estadisticas(por_paso=False)
+        for nombre in ('evaluaciones', 'jacobianas', 'factorizaciones', 'pasos', 'rechazos', 'fallos', 'tiempo'):
+            setattr(copia, nombre, resumen[nombre])
+        copia._iteraciones_suma = resumen['iteraciones']
+        copia._iteraciones_max = resumen['iteraciones_max']
+        copia._tiempo_paso_max = resumen['tiempo_paso_max']
+        return copia
+
+    # Iteraciones de newton registradas hasta ahora, incluidas las que ya sólo
+    # están en los totales; la diferencia entre dos llamadas es lo que hizo
+    # un integrador entre ellas.
+    def total_iteraciones(self):
+        return self._iteraciones_suma + sum(self._iteraciones)
+
+    def resumen(self):
+        iteraciones = self.iteraciones
+        tiempo_paso = self.tiempo_paso
+        return {'evaluaciones': self.evaluaciones, 'jacobianas': self.jacobianas,
+                'factorizaciones': self.factorizaciones, 'pasos': self.pasos, 'rechazos': self.rechazos,
+                'iteraciones': self._iteraciones_suma + int(iteraciones.sum()),
+                'iteraciones_max': max(self._iteraciones_max, int(iteraciones.max()) if len(iteraciones) else 0),
+                'fallos': self.fallos, 'tiempo': self.tiempo,
+                'tiempo_paso_max': max(self._tiempo_paso_max,
+                                       float(tiempo_paso.max()) if len(tiempo_paso) else 0.0)}
+
+
+def estadisticas_de(estado):
+    return None if estado is None else estado.setdefault('estadisticas', Estadisticas())
+
+
+# -------------------------    REGISTRO DE MÉTODOS   ---------------------------
+
+# Cada método numérico se registra con el nombre que usa la interfaz y unos
+# metadatos: orden de convergencia (None si es variable), si es implícito y
+# su clase de costo por paso ('bajo', 'medio' o 'alto').
+# El indicador 'lote' dice si la función acepta directamente un estado (5, M)
+# con parámetros (7, M), es decir, si integra M trayectorias con aritmética
+# de arreglos en lugar de un ciclo de Python por trayectoria.
+Metodo = namedtuple('Metodo', ['funcion', 'orden', 'implicito', 'costo', 'lote'])
+
+METODOS = {}
+
+
+# Decorador para registrar un método: @registrar('Nombre', orden, implicito, costo, lote)
+# La función registrada debe tener la firma funcion(params, time, z0=None,
+# estado=None) y devolver una matriz (5, len(time)) con las filas s, e, i, r, p.
+# Si recibe un diccionario estado, deja ahí lo que necesite para continuar la
+# integración además del último valor (el paso de Dormand-Prince, la
+# factorización de Newton) y lo retoma de ahí al continuar (ver extend), y
+# acumula sus contadores en estado['estadisticas'] (ver Estadisticas).
+def registrar(nombre, orden, implicito=False, costo='bajo', lote=False):
+    def decorador(funcion):
+        METODOS[nombre] = Metodo(funcion, orden, implicito, costo, lote)
+        return funcion
+
+    return decorador
 
 
 # -------------------------    MÉTODOS NUMÉRICOS   ---------------------------
 
 # Método de condiciones iniciales:
-
-# -------------------------    MÉTODOS NUMÉRICOS   ---------------------------
-
-# Método de condiciones iniciales:
-
-def init_arr(time):
-    s = np.zeros(len(time))
-    e = np.zeros(len(time))
-    i = np.zeros(len(time))
-    r = np.zeros(len(time))
-    p = np.zeros(len(time))
+# Devuelve una matriz (5, len(time)) cuya primera columna es z0 (por defecto
+# las iniciales). Al desempacarla (s, e, i, r, p = init_arr(time)) cada fila
+# es una vista de la misma matriz contigua.
+# Si z0 es un lote (5, M) se devuelve una vista (5, M, T) de un arreglo
+# contiguo (M, 5, T), que es la forma en que solve_batch entrega el resultado
+# (en general, para z0 (5, ...) una vista (5, ..., T) de (..., 5, T)).
+def init_arr(time, z0=None):
     #      s(t) + e(t) + i(t) + r(t) + p(t) = 1
-    s[0] = iniciales[0]
-    e[0] = iniciales[1]
-    i[0] = iniciales[2]
-    r[0] = iniciales[3]
-    p[0] = iniciales[4]
-
-    return s, e, i, r, p
+    z0 = np.asarray(iniciales if z0 is None else z0, dtype=float)
+    if z0.ndim == 1:
+        z = np.zeros((5, len(time)))
+    else:
+        z = np.moveaxis(np.zeros(z0.shape[1:] + (5, len(time))), -2, 0)
+    z[..., 0] = z0
+    return z
+
+
+# Pasos de los métodos explícitos: avanzan el estado z un paso de tamaño h
+# con f(z) las derivadas, por ejemplo lambda w: rhs(w, params) o el rhs de
+# un sistema de regiones.py o edades.py.
+def paso_euler(z, h, f):
+    return z + h * f(z)
+
+
+def paso_rk2(z, h, f):
+    k1 = f(z)
+    k2 = f(z + h * k1)
+    return z + (h / 2.0) * (k1 + k2)
+
+
+def paso_rk4(z, h, f):
+    k1 = f(z)
+    k2 = f(z + 0.5 * h * k1)
+    k3 = f(z + 0.5 * h * k2)
+    k4 = f(z + h * k3)
+    return z + (h / 6.0) * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+
+
+# Integrador genérico de paso fijo: aplica paso(z, h, f) sobre la malla
+# time, tomando h de la propia malla, y guarda cada estado en una columna.
+# Funciona igual para un estado (5,) que para un lote (5, M).
+# param5: estadisticas: Estadisticas a llenar (o None); etapas es el número
+# de evaluaciones de rhs de cada paso.
+def integrar_explicito(paso, f, time, z0=None, estadisticas=None, etapas=1):
+    z = init_arr(time, z0)
+    if estadisticas is None:
+        for it in range(1, len(time)):
+            z[..., it] = paso(z[..., it - 1], time[it] - time[it - 1], f)
+        return z
+    al_paso = estadisticas.al_paso
+    tiempos = np.empty(len(time) - 1)
+    antes = perf_counter()
+    for it in range(1, len(time)):
+        z[..., it] = paso(z[..., it - 1], time[it] - time[it - 1], f)
+        if al_paso is not None:
+            al_paso(time[it], z[..., it])
+        ahora = perf_counter()
+        tiempos[it - 1] = ahora - antes
+        antes = ahora
+    estadisticas.agregar_pasos(tiempos, etapas * len(tiempos))
+    return z
 
 
 # EULER FORWARD:
-def euler_forward(params, time):
-    k, a_i, a_e, y, b, rho, mu = params
-    S_EulerFor, E_EulerFor, I_EulerFor, R_EulerFor, P_EulerFor = init_arr(time)
-    h = abs(time[1] - time[0])
-
-    for i in range(1, len(time)):
-        S_EulerFor[i] = S_EulerFor[i - 1] + h * F1(S_EulerFor[i - 1], E_EulerFor[i - 1], I_EulerFor[i - 1],
-                                                   R_EulerFor[i - 1], a_e, a_i, y)
-        E_EulerFor[i] = E_EulerFor[i - 1] + h * F2(S_EulerFor[i - 1], E_EulerFor[i - 1], I_EulerFor[i - 1],
-                                                   a_e, a_i, k, rho)
-        I_EulerFor[i] = I_EulerFor[i - 1] + h * F3(E_EulerFor[i - 1], I_EulerFor[i - 1], k, b, mu)
-        R_EulerFor[i] = R_EulerFor[i - 1] + h * F4(I_EulerFor[i - 1], E_EulerFor[i - 1], R_EulerFor[i - 1],
-                                                   b, rho, y)
-        P_EulerFor[i] = P_EulerFor[i - 1] + h * F5(I_EulerFor[i - 1], mu)
-
-    return S_EulerFor, E_EulerFor, I_EulerFor, R_EulerFor, P_EulerFor
+@registrar('Euler Forward', orden=1, lote=True)
+def euler_forward(params, time, z0=None, estado=None):
+    return integrar_explicito(paso_euler, lambda w: rhs(w, params), time, z0, estadisticas_de(estado))
+
+
+# MODO DE PASO GRUESO (métodos implícitos):
+# Los métodos implícitos son estables con pasos grandes, así que pueden
+# avanzar con pasos de hasta 'paso' días (por ejemplo paso=7, semanal) y
+# luego interpolar sobre la malla pedida con un spline cúbico de Hermite,
+# usando F en los nodos como derivadas.
+# Estable no quiere decir preciso (con BASE y pasos fijos de 7 días Euler
+# Backward deja e < 0 y termina a 0.83 de odeint sin que newton falle), así
+# que el paso se controla por duplicación: cada paso h se da también como
+# dos pasos de h/2, y la diferencia, dividida por 2^orden - 1, estima el
+# error local de los medios pasos, que son los que se guardan. El error se
+# mide como en dormand_prince, con la escala atol + rtol |z|. Si pasa de 1 el
+# paso se parte en dos (el primer medio paso sirve como paso entero del
+# nuevo intento); si queda holgado se duplica, hasta volver a 'paso'. Como h
+# siempre es paso / 2^k, se guarda una factorización de newton por cada h y
+# se reutiliza entre pasos. Se avisa si un paso no alcanza la tolerancia ni
+# con paso / 1024, o si la solución interpolada tiene algún compartimento
+# negativo. Los ganchos y las estadísticas sólo ven los pasos aceptados, como
+# dos nodos (sus medios pasos); los rechazados se cuentan en rechazos.
+# Con BASE y paso=7 (error máximo respecto a odeint y tiempo; entre
+# paréntesis, con h = 1 sobre la malla):
+#     Euler Backward, 150 días:   1.5e-2 en 5.6 ms   (5.6e-2 en 3.9 ms)
+#                     1000 días:  1.5e-2 en 9.6 ms   (5.6e-2 en 10.3 ms)
+#     con rtol=0.1, atol=1e-3:    4.7e-2 en 2.7 ms y 7.0 ms
+#     Euler Modified, 150 días:   3.5e-3 en 2.6 ms   (1.2e-3 en 4.5 ms)
+#                     1000 días:  3.5e-3 en 7.3 ms   (1.2e-3 en 13.3 ms)
+#     con rtol=1e-3, atol=1e-5:   4.9e-4 en 4.7 ms y 9.1 ms
+# En 1000 días se aceptan 183 pasos con Euler Backward (132 de 7 días; en la
+# subida de la epidemia bajan a 0.44) y 147 con Euler Modified (el menor de
+# 3.5), contra 999 con h = 1, pero cada uno cuesta tres pasos implícitos.
+RTOL_GRUESO = 1e-2
+ATOL_GRUESO = 1e-4
+
+
+def interpolar(t_nodos, z_nodos, params, time):
+    from scipy.interpolate import CubicHermiteSpline
+    return CubicHermiteSpline(t_nodos, z_nodos, rhs(z_nodos, params), axis=1)(time)
+
+
+# param1: nombre: Nombre del método, para los avisos.
+# param2: theta: 1 para Euler Backward, 1/2 para Euler modificado.
+# param3: orden: Orden del método, para estimar el error.
+# param7: paso: Paso máximo.
+def con_paso_grueso(nombre, theta, orden, params, time, z0, paso, estado=None, rtol=None, atol=None):
+    rtol = RTOL_GRUESO if rtol is None else rtol
+    atol = ATOL_GRUESO if atol is None else atol
+    f = lambda w: rhs(w, params)
+    jac = lambda w: jacobiana(w, params)
+    estadisticas = estadisticas_de(estado)
+    al_paso, al_fallo = (estadisticas.al_paso, estadisticas.al_fallo) if estadisticas else (None, None)
+    # Basta con que newton converja bastante por debajo del error tolerado.
+    tol_newton = 1e-3 * atol
+    trabajo = Estadisticas(por_paso=False)  # newton en todos los intentos, aceptados o no
+    resolvers = {}  # factorización de newton por tamaño de paso
+
+    # La aproximación inicial de newton se extrapola con la pendiente dada.
+    def avanzar(z, f_z, h, pendiente):
+        w, resolvers[h], convergio = paso_theta(theta, f, jac, z, f_z, h, resolvers.get(h),
+                                                estadisticas=trabajo, inicial=z + h * pendiente,
+                                                tol=tol_newton)
+        return w, convergio
+
+    h_min = paso / 1024.0
+    t, t_fin = time[0], time[-1]
+    z = init_arr(time[:1], z0)[:, 0]
+    f_z = f(z) if theta < 1 else None
+    t_nodos, z_nodos = [t], [z]
+    h = paso
+    pendiente = 0.0  # del último medio paso aceptado
+    entero = None  # resultado de un solo paso de h desde z, si ya se tiene
+    evaluaciones = int(theta < 1)
+    rechazos = excedidos = fallos = 0
+    tiempos = []
+    antes = perf_counter()
+    while t < t_fin:
+        ultimo = h >= t_fin - t
+        if ultimo:
+            h = t_fin - t
+        if entero is None:
+            entero, _ = avanzar(z, f_z, h, pendiente)
+        medio, convergio_medio = avanzar(z, f_z, h / 2, pendiente)
+        f_medio = f(medio) if theta < 1 else None
+        final, convergio = avanzar(medio, f_medio, h / 2, (medio - z) / (h / 2))
+        evaluaciones += theta < 1
+        escala = atol + rtol * np.maximum(np.abs(z), np.abs(final))
+        error = np.sqrt(np.mean(((final - entero) / escala) ** 2)) / (2 ** orden - 1)
+        if error > 1.0 and h > h_min:
+            rechazos += 1
+            h /= 2
+            entero = medio
+            continue
+        excedidos += error > 1.0
+        t_medio, t = t + h / 2, t_fin if ultimo else t + h
+        for t_nodo, z_nodo, ok in ((t_medio, medio, convergio_medio), (t, final, convergio)):
+            t_nodos.append(t_nodo)
+            z_nodos.append(z_nodo)
+            fallos += not ok
+            if al_paso is not None or al_fallo is not None:
+                _ganchos(estadisticas, t_nodo, z_nodo, ok)
+        pendiente = (final - medio) / (h / 2)
+        z, entero = final, None
+        f_z = f(z) if theta < 1 else None
+        evaluaciones += theta < 1
+        # Al duplicar h el error local crece unas 2^(orden + 1) veces.
+        if error * 2 ** (orden + 1) < 0.8 and h < paso:
+            h = min(2 * h, paso)
+        if estadisticas is not None:
+            ahora = perf_counter()
+            tiempos += [(ahora - antes) / 2] * 2
+            antes = ahora
+    aviso_newton(nombre, fallos)
+    if excedidos:
+        warnings.warn("%s: %d pasos del modo grueso no alcanzan la tolerancia" % (nombre, excedidos),
+                      RuntimeWarning)
+    if estadisticas is not None:
+        estadisticas.agregar_pasos(np.array(tiempos), trabajo.total_iteraciones() + evaluaciones)
+        estadisticas.jacobianas += trabajo.jacobianas
+        estadisticas.factorizaciones += trabajo.factorizaciones
+        estadisticas.rechazos += rechazos
+        estadisticas.fallos += fallos
+    z = interpolar(np.array(t_nodos), np.array(z_nodos).T, params, time)
+    if z.min() < 0:
+        warnings.warn("%s: el paso grueso deja compartimentos negativos (mínimo %g)" % (nombre, z.min()),
+                      RuntimeWarning)
+    return z
+
+
+# Ganchos de un paso de los métodos implícitos.
+def _ganchos(estadisticas, t, z, convergio):
+    if not convergio and estadisticas.al_fallo is not None:
+        estadisticas.al_fallo(t, z)
+    if estadisticas.al_paso is not None:
+        estadisticas.al_paso(t, z)
+
+
+# MÉTODOS THETA (implícitos):
+# theta = 1 es Euler Backward y theta = 1/2 Euler modificado (trapecio).
+# Cada paso resuelve con newton el sistema implícito
+#     w = z_ant + h ((1 - theta) F(z_ant) + theta F(w)),
+# cuya jacobiana respecto a w es h theta J(w) - I.
+# c J - I, densa o dispersa (scipy.sparse) como J.
+def _menos_identidad(J, c):
+    if isinstance(J, np.ndarray):
+        A = c * J
+        A[np.diag_indices_from(A)] -= 1.0
+        return A
+    from scipy import sparse
+    return c * J - sparse.identity(J.shape[0], format='csc')
+
+
+# Un paso de tamaño h desde z_ant, con f y jac sobre el estado aplanado.
+# param5: f_ant: F(z_ant), sólo se usa con theta < 1.
+# param9: inicial: Aproximación inicial para newton (por defecto z_ant).
+# param10: tol: Tolerancia de newton.
+# Devuelve (w, resolver, convergio) como newton.
+def paso_theta(theta, f, jac, z_ant, f_ant, h, resolver=None, factorizar=factorizar_densa,
+               estadisticas=None, inicial=None, tol=1e-10):
+    fijo = z_ant + h * (1 - theta) * f_ant if theta < 1 else z_ant
+    return newton(lambda w: fijo + h * theta * f(w) - w, lambda w: _menos_identidad(jac(w), h * theta),
+                  z_ant if inicial is None else inicial, resolver, factorizar, tol, estadisticas=estadisticas)
+
+
+# Integrador theta sobre la malla time (h de la malla en cada paso, así que
+# admite mallas no uniformes). La factorización se reutiliza entre pasos
+# mientras h no cambie y newton converja bien, y se guarda en
+# estado['newton'] para continuar con extend. Lo usan los métodos de este
+# módulo, de regiones.py y de edades.py.
+# param1: nombre: Nombre del método, para los avisos.
+# param3: f: Función f(z) con las derivadas en un estado de la forma de z0.
+# param4: jac: Función jac(z) con la jacobiana (n, n) de f respecto al
+# estado aplanado, densa o dispersa.
+# param6: z0: Estado inicial completo, (5,) o por ejemplo (5, R); por
+# defecto iniciales.
+# param8: factorizar: Función para newton (ver factorizar_densa).
+def integrar_theta(nombre, theta, f, jac, time, z0, estado=None, factorizar=factorizar_densa):
+    z = init_arr(time, z0)
+    forma = z.shape[:-1]
+    if len(forma) == 1:
+        f_plano, jac_plano = f, jac
+    else:
+        f_plano = lambda w: f(w.reshape(forma)).ravel()
+        jac_plano = lambda w: jac(w.reshape(forma))
+    resolver, h_ant = (estado or {}).get('newton', (None, None))
+    estadisticas = estadisticas_de(estado)
+    al_paso, al_fallo = (estadisticas.al_paso, estadisticas.al_fallo) if estadisticas else (None, None)
+    iteraciones = estadisticas.total_iteraciones() if estadisticas else 0
+    tiempos = np.empty(len(time) - 1)
+    antes = perf_counter()
+    fallos = 0
+    for it in range(1, len(time)):
+        z_ant = z[..., it - 1].reshape(-1)
+        h = time[it] - time[it - 1]
+        if h != h_ant:
+            # La factorización guardada corresponde a otro paso.
+            resolver = None
+            h_ant = h
+        f_ant = f_plano(z_ant) if theta < 1 else None
+        w, resolver, convergio = paso_theta(theta, f_plano, jac_plano, z_ant, f_ant, h, resolver, factorizar,
+                                            estadisticas)
+        z[..., it] = w.reshape(forma)
+        fallos += not convergio
+        if estadisticas is not None:
+            if al_paso is not None or al_fallo is not None:
+                _ganchos(estadisticas, time[it], z[..., it], convergio)
+            ahora = perf_counter()
+            tiempos[it - 1] = ahora - antes
+            antes = ahora
+    aviso_newton(nombre, fallos)
+    if estadisticas is not None:
+        # Una evaluación de rhs por iteración de newton, más F(z_ant) en cada paso si theta < 1.
+        estadisticas.agregar_pasos(tiempos, estadisticas.total_iteraciones() - iteraciones +
+                                   len(tiempos) * (theta < 1))
+    if estado is not None:
+        estado['newton'] = (resolver, h_ant)
+    return z
 
 
 # EULER BACKWARD
-def euler_backward(params, time):
-    k, a_i, a_e, y, b, rho, mu = params
-
-    S_EulerBack, E_EulerBack, I_EulerBack, R_EulerBack, P_EulerBack = init_arr(time)
-
-    for i in range(1, len(time)):
-        SolBack = opt.fsolve(FEulerBackRoot, np.array([S_EulerBack[i - 1], E_EulerBack[i - 1], I_EulerBack[i - 1],
-                                                       R_EulerBack[i - 1], P_EulerBack[i - 1]]),
-                             (S_EulerBack[i - 1], E_EulerBack[i - 1], I_EulerBack[i - 1], R_EulerBack[i - 1],
-                              P_EulerBack[i - 1], a_e, a_i, k, y, b, rho, mu))
-        S_EulerBack[i] = SolBack[0]
-        E_EulerBack[i] = SolBack[1]
-        I_EulerBack[i] = SolBack[2]
-        R_EulerBack[i] = SolBack[3]
-        P_EulerBack[i] = SolBack[4]
-    return S_EulerBack, E_EulerBack, I_EulerBack, R_EulerBack, P_EulerBack
+# Con paso=h_grueso se integra en modo de paso grueso.
+@registrar('Euler Backward', orden=1, implicito=True, costo='alto')
+def euler_backward(params, time, z0=None, paso=None, rtol=None, atol=None, estado=None):
+    if paso is not None:
+        return con_paso_grueso('Euler Backward', 1.0, 1, params, time, z0, paso, estado, rtol, atol)
+    return integrar_theta('Euler Backward', 1.0, lambda w: rhs(w, params), lambda w: jacobiana(w, params),
+                          time, z0, estado)
 
 
 # EULER MODIFICADO
-def euler_modified(params, time):
-    k, a_i, a_e, y, b, rho, mu = params
-    S_EulerMod, E_EulerMod, I_EulerMod, R_EulerMod, P_EulerMod = init_arr(time)
-
-    for i in range(1, len(time)):
-        SolMod = opt.fsolve(FEulerModRoot, np.array([S_EulerMod[i - 1], E_EulerMod[i - 1], I_EulerMod[i - 1],
-                                                     R_EulerMod[i - 1], P_EulerMod[i - 1]]),
-                            (S_EulerMod[i - 1], E_EulerMod[i - 1], I_EulerMod[i - 1], R_EulerMod[i - 1],
-                             P_EulerMod[i - 1], a_e, a_i, k, y, b, rho, mu))
-        S_EulerMod[i] = SolMod[0]
-        E_EulerMod[i] = SolMod[1]
-        I_EulerMod[i] = SolMod[2]
-        R_EulerMod[i] = SolMod[3]
-        P_EulerMod[i] = SolMod[4]
-    return S_EulerMod, E_EulerMod, I_EulerMod, R_EulerMod, P_EulerMod
-
-
-# EULER FORWARD:
-
-
+# Igual que Euler Backward, con theta = 1/2.
+@registrar('Euler Modified', orden=2, implicito=True, costo='alto')
+def euler_modified(params, time, z0=None, paso=None, rtol=None, atol=None, estado=None):
+    if paso is not None:
+        return con_paso_grueso('Euler Modified', 0.5, 2, params, time, z0, paso, estado, rtol, atol)
+    return integrar_theta('Euler Modified', 0.5, lambda w: rhs(w, params), lambda w: jacobiana(w, params),
+                          time, z0, estado)
 
 
 # RK2
-def runge_2(params, time):
-    k, ai, ae, g, b, rho, u = params
-    s, e, i, r, p = init_arr(time)
-
-    h = abs(time[1] - time[0])
-    for it in range(1, len(time)):
-        ks1 = F1(s[it - 1], e[it - 1], i[it - 1], r[it - 1], ae, ai, g)
-        ks2 = F1(s[it - 1] + ks1 * h, e[it - 1] + ks1 * h, i[it - 1] + ks1 * h, r[it - 1] + ks1 * h, ae, ai, g)
-        s[it] = s[it - 1] + (h / 2) * (ks1 + ks2)
-
-        ke1 = F2(s[it - 1], e[it - 1], i[it - 1], ae, ai, k, rho)
-        ke2 = F2(s[it - 1] + ke1 * h, e[it - 1] + ke1 * h, i[it - 1] + ke1 * h, ae, ai, k, rho)
-        e[it] = e[it - 1] + (h / 2) * (ke1 + ke2)
-
-        ki1 = F3(e[it - 1], i[it - 1], k, b, u)
-        ki2 = F3(e[it - 1] + ki1 * h, i[it - 1] + ki1 * h, k, b, u)
-        i[it] = i[it - 1] + (h / 2) * (ki1 + ki2)
-
-        kr1 = F4(e[it - 1], i[it - 1], r[it - 1], b, rho, g)
-        kr2 = F4(e[it - 1] + kr1 * h, i[it - 1] + kr1 * h, r[it - 1] + kr1 * h, b, rho, g)
-        r[it] = r[it - 1] + (h / 2) * (kr1 + kr2)
-
-        kp1 = F5(i[it - 1], u)
-        kp2 = F5(i[it - 1] + kp1 * h, u)
-
-        p[it] = p[it - 1] + (h / 2) * (kp1 + kp2)
-
-    return s, e, i, r, p
+@registrar('Runge-Kutta 2', orden=2, lote=True)
+def runge_2(params, time, z0=None, estado=None):
+    return integrar_explicito(paso_rk2, lambda w: rhs(w, params), time, z0, estadisticas_de(estado), 2)
 
 
 # RK4
-def runge_4(params, time):
-    k, ai, ae, g, b, rho, u = params
-    s, e, i, r, p = init_arr(time)
-
-    h = abs(time[1] - time[0])
-    for it in range(1, len(time)):
-        ks1 = F1(s[it - 1], e[it - 1], i[it - 1], r[it - 1], ae, ai, g)
-        ks2 = F1(s[it - 1] + 0.5 * h * ks1, e[it - 1] + 0.5 * h * ks1, i[it - 1] + 0.5 * h * ks1,
-                 r[it - 1] + 0.5 * h * ks1, ae, ai, g)
-        ks3 = F1(s[it - 1] + 0.5 * h * ks2, e[it - 1] + 0.5 * h * ks2, i[it - 1] + 0.5 * h * ks2,
-                 r[it - 1] + 0.5 * h * ks2, ae, ai, g)
-        ks4 = F1(s[it - 1] + h * ks3, e[it - 1] + h * ks3, i[it - 1] + h * ks3, r[it - 1] + h * ks3, ae, ai, g)
-        s[it] = s[it - 1] + (h / 6.0) * (ks1 + 2.0 * ks2 + 2.0 * ks3 + ks4)
-
-        ke1 = F2(s[it - 1], e[it - 1], i[it - 1], ae, ai, k, rho)
-        ke2 = F2(s[it - 1] + 0.5 * h * ke1, e[it - 1] + 0.5 * h * ke1, i[it - 1] + 0.5 * h * ke1, ae, ai, k, rho)
-        ke3 = F2(s[it - 1] + 0.5 * h * ke2, e[it - 1] + 0.5 * h * ke2, i[it - 1] + 0.5 * h * ke2, ae, ai, k, rho)
-        ke4 = F2(s[it - 1] + h * ke3, e[it - 1] + h * ke3, i[it - 1] + h * ke3, ae, ai, k, rho)
-        e[it] = e[it - 1] + (h / 6.0) * (ke1 + 2.0 * ke2 + 2.0 * ke3 + ke4)
-
-        ki1 = F3(e[it - 1], i[it - 1], k, b, u)
-        ki2 = F3(e[it - 1] + 0.5 * h * ki1, i[it - 1] + 0.5 * h * ki1, k, b, u)
-        ki3 = F3(e[it - 1] + 0.5 * h * ki2, i[it - 1] + 0.5 * h * ki2, k, b, u)
-        ki4 = F3(e[it - 1] + h * ki3, i[it - 1] + h * ki3, k, b, u)
-        i[it] = i[it - 1] + (h / 6.0) * (ki1 + 2.0 * ki2 + 2.0 * ki3 + ki4)
-
-        kr1 = F4(e[it - 1], i[it - 1], r[it - 1], b, rho, g)
-        kr2 = F4(e[it - 1] + 0.5 * h * kr1, i[it - 1] + 0.5 * h * kr1, r[it - 1] + 0.5 * h * kr1, b, rho, g)
-        kr3 = F4(e[it - 1] + 0.5 * h * kr2, i[it - 1] + 0.5 * h * kr2, r[it - 1] + 0.5 * h * kr2, b, rho, g)
-        kr4 = F4(e[it - 1] + h * kr3, i[it - 1] + h * kr3, r[it - 1] + h * kr3, b, rho, g)
-        r[it] = r[it - 1] + (h / 6.0) * (kr1 + 2.0 * kr2 + 2.0 * kr3 + kr4)
-
-        kp1 = F5(i[it - 1], u)
-        kp2 = F5(i[it - 1] + 0.5 * h * kp1, u)
-        kp3 = F5(i[it - 1] + 0.5 * h * kp2, u)
-        kp4 = F5(i[it - 1] + h * kp3, u)
-        p[it] = p[it - 1] + (h / 6.0) * (kp1 + 2.0 * kp2 + 2.0 * kp3 + kp4)
-
-    return s, e, i, r, p
-
-
-def aux_odeint(z, t, k, ai, ae, y, b, pp, u):
-    s, e, i, r, p = z
-    dsdt = -ae * s * e - ai * s * i + y * r
-    dedt = ae * s * e + ai * s * i - k * e - pp * e
-    didt = k * e - b * i - u * i
-    drdt = b * i + p * e - y * r
-    dpdt = u * i
-    return [dsdt, dedt, didt, drdt, dpdt]
-
-
-def odeint_s(params, range):
-    z = odeint(aux_odeint, iniciales, range, args=tuple(params))
-    return z[:, 0], z[:, 1], z[:, 2], z[:, 3], z[:, 4]
-
-
-def solve(method, params, range):
-    return {
-        'Euler Forward': euler_forward(params, range),
-        'Euler Backward': euler_backward(params, range),
-        'Euler Modified': euler_modified(params, range),
-        'Runge-Kutta 2': runge_2(params, range),
-        'Runge-Kutta 4': runge_4(params, range),
-        'odeint/ivp-solve': odeint_s(params, range),
-    }[method]
+@registrar('Runge-Kutta 4', orden=4, costo='medio', lote=True)
+def runge_4(params, time, z0=None, estado=None):
+    return integrar_explicito(paso_rk4, lambda w: rhs(w, params), time, z0, estadisticas_de(estado), 4)
+
+
+# DORMAND-PRINCE 5(4):
+# Par encajado de Runge-Kutta de orden 5 con estimador de error de orden 4.
+# Los coeficientes son los de Dormand y Prince (1980); la salida densa de
+# orden 4 usa los de Shampine (1986).
+DP_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1])
+DP_A = np.array([
+    [0, 0, 0, 0, 0],
+    [1 / 5, 0, 0, 0, 0],
+    [3 / 40, 9 / 40, 0, 0, 0],
+    [44 / 45, -56 / 15, 32 / 9, 0, 0],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729, 0],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656]])
+DP_B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84])
+DP_E = np.array([-71 / 57600, 0, 71 / 16695, -71 / 1920, 17253 / 339200, -22 / 525, 1 / 40])
+DP_P = np.array([
+    [1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799],
+    [0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072],
+    [0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632],
+    [0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844],
+    [0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423]])
+
+
+# Paso inicial a partir de la escala del estado y de su derivada.
+def paso_inicial(z, f, rtol, atol):
+    escala = atol + rtol * np.abs(z)
+    d0 = np.sqrt(np.mean((z / escala) ** 2))
+    d1 = np.sqrt(np.mean((f / escala) ** 2))
+    return 0.01 * d0 / d1 if d0 > 1e-5 and d1 > 1e-5 else 1e-6
+
+
+# Funciones planas (sobre el estado aplanado) de f y jac para un estado de
+# forma 'forma'; para un estado (5,) son las mismas funciones.
+def _aplanar(forma, f, jac=None):
+    if len(forma) == 1:
+        return f, jac
+    return (lambda w: f(w.reshape(forma)).ravel()), (jac and (lambda w: jac(w.reshape(forma))))
+
+
+# El paso se adapta con el error local (rtol, atol) sin importar la malla;
+# los valores en los puntos de time se obtienen con la salida densa.
+# param1: f: Lado derecho f(z) para un estado con la forma de z0.
+# param2: time: Malla de tiempo.
+# param3: z0: Estado inicial, (5,) o por ejemplo (5, G); por defecto iniciales.
+# param6: h0: Paso inicial (por defecto el de estado o uno estimado).
+def integrar_dp(f, time, z0=None, rtol=1e-6, atol=1e-9, h0=None, estado=None):
+    z = init_arr(time, z0)
+    forma = z.shape[:-1]
+    f, _ = _aplanar(forma, f)
+    t, t_fin = time[0], time[-1]
+    y = z[..., 0].ravel()
+    f_y = f(y)
+    h = h0 or (estado or {}).get('h') or paso_inicial(y, f_y, rtol, atol)
+    estadisticas = estadisticas_de(estado)
+    tiempos = []
+    intentos = 0
+    antes = perf_counter()
+    K = np.empty((7, y.size))
+    j = 1
+    while j < len(time):
+        ultimo = h >= t_fin - t
+        if ultimo:
+            h = t_fin - t
+        K[0] = f_y
+        for s in range(1, 6):
+            K[s] = f(y + h * DP_A[s, :s].dot(K[:s]))
+        y_nuevo = y + h * DP_B.dot(K[:6])
+        f_nuevo = f(y_nuevo)
+        K[6] = f_nuevo
+        intentos += 1
+
+        escala = atol + rtol * np.maximum(np.abs(y), np.abs(y_nuevo))
+        error = np.sqrt(np.mean((h * DP_E.dot(K) / escala) ** 2))
+        if error <= 1.0:
+            t_nuevo = t_fin if ultimo else t + h
+            # Salida densa en los puntos de la malla que cubre este paso.
+            if time[j] <= t_nuevo:
+                Q = K.T.dot(DP_P)
+                while j < len(time) and time[j] <= t_nuevo:
+                    x = (time[j] - t) / h
+                    z[..., j] = (y + h * Q.dot([x, x ** 2, x ** 3, x ** 4])).reshape(forma)
+                    j += 1
+            t, y, f_y = t_nuevo, y_nuevo, f_nuevo
+            h *= min(10.0, 0.9 * error ** -0.2) if error > 0 else 10.0
+            if estadisticas is not None:
+                if estadisticas.al_paso is not None:
+                    estadisticas.al_paso(t, y.reshape(forma))
+                ahora = perf_counter()
+                tiempos.append(ahora - antes)
+                antes = ahora
+        else:
+            h *= max(0.2, 0.9 * error ** -0.2)
+    if estado is not None:
+        estado['h'] = h
+    if estadisticas is not None:
+        # Seis evaluaciones por intento (K[0] es la última del paso anterior).
+        estadisticas.agregar_pasos(np.array(tiempos), 1 + 6 * intentos)
+        estadisticas.rechazos += intentos - len(tiempos)
+    return z
+
+
+@registrar('Dormand-Prince 5(4)', orden=5, costo='medio')
+def dormand_prince(params, time, z0=None, rtol=1e-6, atol=1e-9, h0=None, estado=None):
+    return integrar_dp(lambda w: rhs(w, params), time, z0, rtol, atol, h0, estado)
+
+
+def aux_odeint(z, t, *params):
+    return rhs(z, params)
+
+
+# ODEINT (LSODA, orden y paso variables)
+@registrar('odeint/ivp-solve', orden=None, costo='medio')
+# Con estadísticas se piden los contadores de LSODA (full_output) en lugar
+# de descartarlos.
+def odeint_s(params, range, z0=None, estado=None):
+    from scipy.integrate import odeint
+    estadisticas = estadisticas_de(estado)
+    if estadisticas is None or len(range) < 2:
+        # Con un solo punto LSODA no da pasos ni contadores.
+        z = odeint(aux_odeint, iniciales if z0 is None else z0, range, args=tuple(params))
+        return z.T
+    inicio = perf_counter()
+    z, info = odeint(aux_odeint, iniciales if z0 is None else z0, range, args=tuple(params), full_output=True)
+    estadisticas.tiempo += perf_counter() - inicio
+    estadisticas.evaluaciones += int(info['nfe'][-1])
+    estadisticas.jacobianas += int(info['nje'][-1])
+    estadisticas.pasos += int(info['nst'][-1])
+    if info['message'] != 'Integration successful.':
+        estadisticas.fallos += 1
+    return z.T
+
+
+# BDF (orden variable 1-5, implícito) de scipy con la jacobiana analítica,
+# evaluado en los puntos de la malla. Es el integrador rígido de Auto.
+# param1: f, jac: Lado derecho y jacobiana (sobre el estado aplanado) para
+# un estado con la forma de z0.
+def integrar_bdf(f, jac, time, z0, rtol=1e-6, atol=1e-9, estadisticas=None):
+    from scipy.integrate import solve_ivp
+    z0 = np.asarray(z0)
+    f, jac = _aplanar(z0.shape, f, jac)
+    inicio = perf_counter()
+    sol = solve_ivp(lambda t, w: f(w), (time[0], time[-1]), z0.ravel(), method='BDF', t_eval=time,
+                    jac=lambda t, w: jac(w), rtol=rtol, atol=atol)
+    if estadisticas is not None:
+        estadisticas.tiempo += perf_counter() - inicio
+        estadisticas.evaluaciones += sol.nfev
+        estadisticas.jacobianas += sol.njev
+        estadisticas.factorizaciones += sol.nlu
+        estadisticas.fallos += not sol.success
+    return sol.y.reshape(z0.shape + (-1,))
+
+
+def bdf(params, time, z0=None, rtol=1e-6, atol=1e-9, estadisticas=None):
+    params = tuple(params)
+    return integrar_bdf(lambda w: rhs(w, params), lambda w: jacobiana(w, params), time,
+                        iniciales if z0 is None else z0, rtol, atol, estadisticas)
+
+
+# AUTO:
+# Detecta la rigidez con el espectro de la jacobiana y elige el integrador.
+# RK4 con el paso de la malla sólo es estable si h |lambda| cae dentro de su
+# región de estabilidad (que llega hasta ~2.78 sobre el eje real negativo)
+# para todos los valores propios lambda; si no, se usa BDF, que es estable
+# con cualquier paso pero cuesta más por paso.
+# La elección se revisa cada 'cada' puntos de la malla (por defecto 20 tramos)
+# con el estado al inicio del tramo, y otra vez al final de los tramos
+# explícitos: si ahí h |lambda| ya salió de la región, o la solución dejó de
+# ser finita, el tramo se repite con BDF.
+# Cada decisión queda en estado['eleccion'] como una Eleccion con el tramo de
+# tiempo, el método usado, el motivo y el mayor h |lambda|max del tramo.
+LIMITE_RK4 = 2.5
+
+Eleccion = namedtuple('Eleccion', ['t_inicio', 't_fin', 'metodo', 'motivo', 'rigidez'])
+
+
+# h por el mayor módulo de los valores propios de la jacobiana en z.
+def rigidez(z, h, params):
+    return float(h * np.abs(np.linalg.eigvals(jacobiana(z, params))).max())
+
+
+# Auto con f y jac genéricos (jac densa, sobre el estado aplanado), para un
+# estado (5,) o por ejemplo (5, G).
+def integrar_auto(f, jac, time, z0=None, cada=None, estado=None):
+    z = init_arr(time, z0)
+    rigidez_en = lambda w, h: float(h * np.abs(np.linalg.eigvals(jac(w))).max())
+    cada = cada or max(50, len(time) // 20)
+    elecciones = [] if estado is None else estado.setdefault('eleccion', [])
+    inicio = 0
+    while inicio < len(time) - 1:
+        fin = min(inicio + cada, len(time) - 1)
+        tramo = time[inicio:fin + 1]
+        h = float(np.max(np.diff(tramo)))
+        rigidez_inicio = rigidez_en(z[..., inicio], h)
+        if rigidez_inicio <= LIMITE_RK4:
+            parcial = integrar_explicito(paso_rk4, f, tramo, z[..., inicio], estadisticas_de(estado), 4)
+            rigidez_fin = rigidez_en(parcial[..., -1], h) if np.all(np.isfinite(parcial)) else np.inf
+            if rigidez_fin <= LIMITE_RK4:
+                eleccion = Eleccion(float(tramo[0]), float(tramo[-1]), 'Runge-Kutta 4',
+                                    "no rígido: h|lambda|max <= %g" % LIMITE_RK4, rigidez_inicio)
+            else:
+                parcial = integrar_bdf(f, jac, tramo, z[..., inicio], estadisticas=estadisticas_de(estado))
+                eleccion = Eleccion(float(tramo[0]), float(tramo[-1]), 'BDF',
+                                    "rígido al final del tramo: RK4 se volvió inestable", rigidez_fin)
+        else:
+            parcial = integrar_bdf(f, jac, tramo, z[..., inicio], estadisticas=estadisticas_de(estado))
+            eleccion = Eleccion(float(tramo[0]), float(tramo[-1]), 'BDF', "rígido: h|lambda|max > %g" % LIMITE_RK4,
+                                rigidez_inicio)
+        z[..., inicio + 1:fin + 1] = parcial[..., 1:]
+        # Tramos seguidos con el mismo método y motivo se informan como uno solo.
+        anterior = elecciones[-1] if elecciones else None
+        if anterior and anterior[2:4] == eleccion[2:4] and anterior.t_fin == eleccion.t_inicio:
+            elecciones[-1] = anterior._replace(t_fin=eleccion.t_fin, rigidez=max(anterior.rigidez, eleccion.rigidez))
+        else:
+            elecciones.append(eleccion)
+        inicio = fin
+    return z
+
+
+@registrar('Auto', orden=None, costo='medio')
+def auto(params, time, z0=None, cada=None, estado=None):
+    params = tuple(params)
+    return integrar_auto(lambda w: rhs(w, params), lambda w: jacobiana(w, params), time, z0, cada, estado)
+
+
+# Empaqueta la salida de un integrador como Solucion, con lo que dejó en estado.
+def _solucion(z, range, params, method, dtype, estado, backend='numpy', **opciones):
+    metadatos = {'backend': backend, 'opciones': opciones}
+    if estado.get('eleccion'):
+        metadatos['eleccion'] = estado['eleccion']
+    return Solucion(z, range, params, method, dtype, estado.get('estadisticas'), metadatos)
+
+
+# Resuelve el sistema con el método pedido. Sólo se ejecuta el integrador
+# seleccionado; un nombre no registrado lanza KeyError.
+# Las opciones adicionales (por ejemplo paso=7 en los métodos implícitos)
+# se pasan tal cual al método.
+# param backend: 'numpy' o 'numba'. Con 'numba' se usa la versión compilada
+# del método (ver compilado.py) si existe y numba está instalado; si no, o si
+# las estadísticas del estado tienen ganchos, se usa la de numpy. Con la
+# versión compilada las estadísticas sólo registran el tiempo y los pasos.
+# param dtype: Tipo con que se guarda la solución (np.float32 ocupa la mitad);
+# la integración siempre se hace en float64.
+# Devuelve una Solucion (ver resultado.py) con la trayectoria (5, T), la
+# malla, los parámetros y las estadísticas de la integración.
+def solve(method, params, range, backend='numpy', dtype=None, **opciones):
+    metodo = METODOS[method]
+    estado = opciones.pop('estado', None)
+    if estado is None:
+        estado = {}
+    if backend == 'numba':
+        import compilado
+        estadisticas = estadisticas_de(estado)
+        ganchos = estadisticas.al_paso is not None or estadisticas.al_fallo is not None
+        if method in compilado.METODOS and set(opciones) <= {'z0'} and not ganchos:
+            inicio = perf_counter()
+            z = compilado.METODOS[method](params, range, **opciones)
+            # El código compilado no cuenta evaluaciones ni iteraciones de newton.
+            estadisticas.tiempo += perf_counter() - inicio
+            estadisticas.pasos += len(range) - 1
+            return _solucion(z, range, params, method, dtype, estado, backend, **opciones)
+    elif backend != 'numpy':
+        raise ValueError("backend desconocido: %s" % backend)
+    z = metodo.funcion(params, range, estado=estado, **opciones)
+    return _solucion(z, range, params, method, dtype, estado, **opciones)
+
+
+# Continúa una solución en lugar de recalcularla desde t = 0.
+# param1: method: Nombre del método registrado.
+# param2: params: k, a_i, a_e, y, b, rho, mu.
+# param3: z_prev: Solucion (o arreglo) (5, n) ya calculada sobre range[:n].
+# param4: range: Malla nueva, que debe empezar con la malla de z_prev.
+# param5: estado: Diccionario de estado del integrador que se usó para z_prev
+# (se actualiza con el de la cola).
+# Si la malla nueva es más corta se devuelve una vista de z_prev sin calcular
+# nada; si es más larga sólo se integra la cola, partiendo del último estado.
+def extend(method, params, z_prev, range, estado=None, **opciones):
+    n = z_prev.shape[-1]
+    if not isinstance(z_prev, Solucion):
+        z_prev = Solucion(z_prev, range[:n], params, method)
+    if len(range) <= n:
+        return z_prev.ventana(0, len(range))
+    if estado is None:
+        estado = {}
+    cola = METODOS[method].funcion(params, range[n - 1:], z0=z_prev[..., -1], estado=estado, **opciones)
+    z = np.concatenate((z_prev.z, cola[..., 1:]), axis=-1)
+    return _solucion(z, range, params, method, z_prev.dtype, estado, **opciones)
+
+
+# Resuelve M trayectorias en una sola llamada (barridos de parámetros).
+# param1: method: Nombre del método registrado.
+# param2: params: Matriz (M, 7) con un juego k, a_i, a_e, y, b, rho, mu por fila.
+# param3: z0: Matriz (M, 5) con las condiciones iniciales de cada trayectoria.
+# param4: range: Malla de tiempo con T puntos.
+# param5: dtype: Tipo con que se guarda la solución (ver solve).
+# Devuelve una Solucion con z de forma (M, 5, T). Los métodos con lote=True
+# avanzan todo el lote a la vez; el resto se resuelve trayectoria por
+# trayectoria.
+def solve_batch(method, params, z0, range, dtype=None):
+    metodo = METODOS[method]
+    params = np.asarray(params, dtype=float)
+    z0 = np.asarray(z0, dtype=float)
+    if params.shape[0] != z0.shape[0]:
+        raise ValueError("params y z0 deben tener el mismo número de filas")
+    if metodo.lote:
+        z = np.moveaxis(metodo.funcion(params.T, range, z0.T), 1, 0)
+    else:
+        z = np.empty((len(params), 5, len(range)), dtype=dtype)
+        for j in np.arange(len(params)):
+            z[j] = metodo.funcion(params[j], range, z0[j])
+    return Solucion(z, range, params, method, dtype, metadatos={'iniciales': z0})
+
+
+# Resuelve por bloques: generador que entrega la trayectoria en Soluciones
+# de 'bloque' puntos consecutivos de range (el último puede ser más corto),
+# a medida que se calculan. Cada bloque retoma el integrador desde la última
+# columna del anterior con el mismo diccionario estado, como extend, así que
+# funciona con cualquier método registrado y la memoria usada no depende de
+# la duración (las estadísticas se crean con por_paso=False). El estado
+# final es la última columna del último bloque.
+# Para reducir los bloques sin guardar la serie completa ver reductores.py.
+# param1: method: Nombre del método registrado.
+# param2: params: k, a_i, a_e, y, b, rho, mu; (7, M) con z0 (5, M) para un
+# lote de M trayectorias en los métodos con lote=True. Los bloques de un
+# lote son Soluciones (M, 5, n), como las de solve_batch.
+# param3: range: Malla de tiempo completa.
+# param4: bloque: Puntos de cada bloque.
+def solve_por_bloques(method, params, range, bloque=1000, z0=None, estado=None, **opciones):
+    funcion = METODOS[method].funcion
+    estado = {} if estado is None else estado
+    estado.setdefault('estadisticas', Estadisticas(por_paso=False))
+    hecho = 0
+    while hecho < len(range):
+        fin = min(hecho + bloque, len(range))
+        if hecho == 0:
+            z = funcion(params, range[:fin], z0=z0, estado=estado, **opciones)
+        else:
+            z = funcion(params, range[hecho - 1:fin], z0=z0, estado=estado, **opciones)[..., 1:]
+        if z.ndim == 2:
+            yield _solucion(z, range[hecho:fin], params, method, None, estado, **opciones)
+        else:
+            yield _solucion(np.moveaxis(z, 0, -2), range[hecho:fin], np.transpose(params), method, None, estado,
+                            **opciones)
+        z0 = z[..., -1].copy()
+        hecho = fin
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+'''
+=============================================================
+        REDUCTORES PARA SOLUCIONES ENTREGADAS POR BLOQUES
+=============================================================
+
+Resumen la trayectoria a medida que llegan los bloques de
+logica.solve_por_bloques, sin guardar nunca la serie completa:
+
+    bloques = logica.solve_por_bloques('Runge-Kutta 4', params, np.arange(0, 1e6, 0.1))
+    pico, diario, muestra = reducir(bloques, Pico('i'), Agregado(1.0), Submuestreo(100))
+
+Cada reductor tiene agregar(bloque), que recibe una Solucion (5, n) o
+(M, 5, n), y resultado(). La memoria que usan depende del tamaño del
+resumen (número de días, de muestras), no del de la trayectoria.
+'''
+
+import numpy as np
+
+from resultado import COMPARTIMENTOS, Solucion
+
+
+# Pasa todos los bloques por los reductores y devuelve sus resultados.
+def reducir(bloques, *reductores):
+    for bloque in bloques:
+        for reductor in reductores:
+            reductor.agregar(bloque)
+    return [reductor.resultado() for reductor in reductores]
+
+
+# Máximo de un compartimento y el instante en que se alcanza.
+# resultado() devuelve (valor, t) (arreglos si la solución es un lote).
+class Pico:
+    def __init__(self, compartimento='i'):
+        self.fila = COMPARTIMENTOS.index(compartimento)
+        self.valor = None
+        self.t = None
+
+    def agregar(self, bloque):
+        serie = bloque.z[..., self.fila, :]
+        indice = np.argmax(serie, axis=-1)
+        valor = np.take_along_axis(serie, indice[..., None], axis=-1)[..., 0]
+        t = bloque.t[indice]
+        if self.valor is None:
+            self.valor, self.t = valor, t
+        else:
+            mejor = valor > self.valor
+            self.valor, self.t = np.where(mejor, valor, self.valor), np.where(mejor, t, self.t)
+
+    def resultado(self):
+        return self.valor, self.t
+
+
+# Agrega los puntos por periodos de tiempo (días, con periodo=1, o semanas
+# con periodo=7), contados desde el primer instante.
+# param2: como: 'media', 'max' o 'ultimo' (el último punto de cada periodo,
+# útil para p, que es acumulado).
+# resultado() devuelve una Solucion con el inicio de cada periodo como malla.
+class Agregado:
+    def __init__(self, periodo=1.0, como='media'):
+        if como not in ('media', 'max', 'ultimo'):
+            raise ValueError("agregación desconocida: %s" % como)
+        self.periodo = periodo
+        self.como = como
+        self.t0 = None
+        self.metodo = None
+        self.params = None
+        self._cerrados = []
+        self._indices = []
+        # Periodo abierto: índice, suma (o máximo, o último) y cantidad de puntos.
+        self._abierto = None
+
+    def agregar(self, bloque):
+        if self.t0 is None:
+            self.t0, self.metodo, self.params = bloque.t[0], bloque.metodo, bloque.params
+        periodos = np.floor((bloque.t - self.t0) / self.periodo).astype(np.int64)
+        cortes = np.flatnonzero(np.diff(periodos)) + 1
+        inicios = np.concatenate(([0], cortes))
+        if self.como == 'media':
+            valores = np.add.reduceat(bloque.z, inicios, axis=-1)
+        elif self.como == 'max':
+            valores = np.maximum.reduceat(bloque.z, inicios, axis=-1)
+        else:
+            valores = bloque.z[..., np.append(cortes, bloque.z.shape[-1]) - 1]
+        cantidades = np.diff(np.append(inicios, len(periodos)))
+        indices = periodos[inicios]
+
+        # El primer periodo del bloque puede continuar el que quedó abierto.
+        if self._abierto is not None and self._abierto[0] == indices[0]:
+            valores[..., 0] = self._combinar(self._abierto[1], valores[..., 0])
+            cantidades[0] += self._abierto[2]
+        elif self._abierto is not None:
+            self._cerrar(*self._abierto)
+        for j in range(len(indices) - 1):
+            self._cerrar(indices[j], valores[..., j], cantidades[j])
+        self._abierto = (indices[-1], valores[..., -1], cantidades[-1])
+
+    def _combinar(self, anterior, nuevo):
+        if self.como == 'media':
+            return anterior + nuevo
+        if self.como == 'max':
+            return np.maximum(anterior, nuevo)
+        return nuevo
+
+    def _cerrar(self, indice, valor, cantidad):
+        self._indices.append(indice)
+        self._cerrados.append(valor / cantidad if self.como == 'media' else valor)
+
+    def resultado(self):
+        cerrados, indices = list(self._cerrados), list(self._indices)
+        if self._abierto is not None:
+            indice, valor, cantidad = self._abierto
+            indices.append(indice)
+            cerrados.append(valor / cantidad if self.como == 'media' else valor)
+        if not cerrados:
+            return None
+        return Solucion(np.stack(cerrados, axis=-1), self.t0 + self.periodo * np.array(indices),
+                        self.params, self.metodo, metadatos={'periodo': self.periodo, 'agregacion': self.como})
+
+
+# Se queda con uno de cada 'cada' puntos de la trayectoria completa
+# (los de índice 0, cada, 2 cada, ...), sin importar cómo se partió en bloques.
+class Submuestreo:
+    def __init__(self, cada):
+        self.cada = cada
+        self.vistos = 0
+        self._z = []
+        self._t = []
+        self.metodo = None
+        self.params = None
+
+    def agregar(self, bloque):
+        self.metodo, self.params = bloque.metodo, bloque.params
+        primero = -self.vistos % self.cada
+        self._z.append(np.array(bloque.z[..., primero::self.cada]))
+        self._t.append(bloque.t[primero::self.cada])
+        self.vistos += bloque.z.shape[-1]
+
+    def resultado(self):
+        if not self._z:
+            return None
+        return Solucion(np.concatenate(self._z, axis=-1), np.concatenate(self._t), self.params, self.metodo,
+                        metadatos={'cada': self.cada})
@@ -0,0 +1,270 @@
+'''
+=============================================================
+        MODELO SEIRP CON VARIAS REGIONES (METAPOBLACIÓN)
+=============================================================
+
+R regiones, cada una con las ecuaciones F1..F5 de logica.py y sus propios
+parámetros, acopladas por el intercambio de personas entre ellas. Con
+z_c el vector (R,) de un compartimento c (fracciones de la población de
+cada región):
+
+    dz_c/dt = F_c(z) + L z_c,   L = A - diag(A 1)
+
+donde A es la matriz de movilidad (dispersa): A[i, j] es la tasa (por día)
+a la que la población de la región i se intercambia con la de la región j.
+El término L z_c = sum_j A[i, j] (z_c[j] - z_c[i]) es un intercambio
+equilibrado: la población de cada región no cambia y, si se mueven los cinco
+compartimentos (el valor por defecto), s + e + i + r + p sigue siendo
+constante en cada una. Con moviles=('s', 'e', 'i', 'r') los fallecidos se
+quedan en su región y la suma deja de ser exactamente constante.
+
+El estado se guarda como una matriz (5, R) y las soluciones como una
+Solucion (R, 5, T), igual que un lote de solve_batch: solucion.trayectoria(r)
+es la región r. La parte local se evalúa con logica.rhs sobre todas las
+regiones a la vez y la jacobiana es una matriz dispersa (5R, 5R), que los
+métodos implícitos factorizan con splu o resuelven con GMRES (ver
+logica.newton y FACTORIZACIONES). splu es más rápido en redes de movilidad
+locales (vecinos geográficos), pero en redes muy conectadas su relleno crece
+como R^2; GMRES cuesta un poco más por paso y crece linealmente con R en
+cualquier red. Por defecto (lineal='auto') se elige según el ancho de banda
+de la red, ver elegir_lineal.
+
+    sistema = Metapoblacion(params, movilidad)      # params (7,) o (R, 7)
+    solucion = solve('Euler Backward', sistema, np.arange(0, 151.))
+
+Los métodos se registran con los mismos nombres y metadatos que en logica,
+menos Auto (ver METODOS).
+'''
+
+import numpy as np
+
+import logica
+from resultado import COMPARTIMENTOS, Solucion
+
+
+# Ancho de banda de la red de movilidad después de ordenarla con
+# Cuthill-McKee inverso (sobre A + A^T).
+def _ancho_de_banda(A):
+    from scipy import sparse
+    from scipy.sparse.csgraph import reverse_cuthill_mckee
+    if A.nnz == 0:
+        return 0
+    simetrica = (A + A.T).tocsr()
+    orden = reverse_cuthill_mckee(simetrica, symmetric_mode=True)
+    permutada = sparse.coo_matrix(simetrica[orden][:, orden])
+    return int(np.abs(permutada.row - permutada.col).max())
+
+
+class Metapoblacion:
+    # param1: params: k, a_i, a_e, y, b, rho, mu; (7,) para todas las regiones
+    # o (R, 7) con un juego por región.
+    # param2: movilidad: Matriz (R, R) de tasas de intercambio (scipy.sparse o
+    # densa); la diagonal se ignora.
+    # param3: moviles: Compartimentos que se mueven entre regiones.
+    def __init__(self, params, movilidad, moviles=COMPARTIMENTOS):
+        from scipy import sparse
+        A = sparse.csr_matrix(movilidad, dtype=float)
+        A.setdiag(0)
+        A.eliminate_zeros()
+        self.R = A.shape[0]
+        if A.shape != (self.R, self.R):
+            raise ValueError("la matriz de movilidad debe ser cuadrada")
+        self.params = np.array(np.broadcast_to(np.asarray(params, dtype=float), (self.R, 7)))
+        self.columnas = tuple(self.params.T)  # un arreglo (R,) por parámetro, como usa logica.rhs
+        self.moviles = [COMPARTIMENTOS.index(c) for c in moviles]
+        self.L = (A - sparse.diags(np.asarray(A.sum(axis=1)).ravel())).tocsr()
+        self.ancho = _ancho_de_banda(A)
+        self._estructura()
+
+    # Filas y columnas de la jacobiana dispersa, que no cambian entre
+    # evaluaciones: las 13 entradas no nulas de la jacobiana local de cada
+    # región y el bloque L de cada compartimento móvil.
+    def _estructura(self):
+        R = self.R
+        regiones = np.arange(R)
+        self._locales = ((0, 0), (0, 1), (0, 2), (0, 3), (1, 0), (1, 1), (1, 2),
+                         (2, 1), (2, 2), (3, 1), (3, 2), (3, 3), (4, 2))
+        L = self.L.tocoo()
+        filas = [a * R + regiones for a, b in self._locales] + [c * R + L.row for c in self.moviles]
+        columnas = [b * R + regiones for a, b in self._locales] + [c * R + L.col for c in self.moviles]
+        self._filas = np.concatenate(filas)
+        self._columnas = np.concatenate(columnas)
+        self._movilidad = np.tile(L.data, len(self.moviles))
+
+    # Derivadas del sistema en z (5, R). Devuelve (5, R).
+    def rhs(self, z):
+        f = logica.rhs(z, self.columnas)
+        f[self.moviles] += (self.L @ z[self.moviles].T).T
+        return f
+
+    # Jacobiana dispersa (5R, 5R) en z (5, R), con las variables ordenadas
+    # por compartimento: la entrada c * R + r es el compartimento c de la región r.
+    def jacobiana(self, z):
+        from scipy import sparse
+        k, a_i, a_e, y, b, rho, mu = self.columnas
+        s, e, i, r, p = z
+        fuerza = a_e * e + a_i * i
+        locales = (-fuerza, -a_e * s, -a_i * s, y, fuerza, a_e * s - k - rho, a_i * s,
+                   k, -b - mu, rho, b, -y, mu)
+        datos = np.concatenate([np.broadcast_to(v, self.R) for v in locales] + [self._movilidad])
+        n = 5 * self.R
+        return sparse.csc_matrix((datos, (self._filas, self._columnas)), shape=(n, n))
+
+
+# Factorizaciones para logica.newton con la matriz dispersa del paso
+# implícito, A = h theta J - I (ver logica.integrar_theta).
+# Directa: LU de scipy (splu). El orden de mínimo grado sobre A + A^T es el
+# que menos llena deja con estas matrices; aun así, con redes de movilidad
+# muy conectadas (por ejemplo aleatorias) el relleno crece como R^2.
+def factorizar_dispersa(A):
+    from scipy.sparse.linalg import splu
+    return splu(A.tocsc(), permc_spec='MMD_AT_PLUS_A').solve
+
+
+# Iterativa: GMRES precondicionado con la inversa de los bloques locales de
+# 5x5 de cada región (A sin los términos de movilidad entre regiones). Como
+# h por las tasas de movilidad es pequeño, converge en pocas iteraciones y
+# el costo es lineal en R con cualquier red; newton tolera la solución
+# aproximada del sistema lineal.
+def factorizar_iterativa(A, rtol=1e-12):
+    from scipy.sparse.linalg import LinearOperator, gmres
+    A = A.tocsr()
+    n = A.shape[0]
+    R = n // 5
+    regiones = np.arange(R)
+    filas = (np.arange(5)[:, None, None] * R + regiones).repeat(5, axis=1)
+    columnas = filas.transpose(1, 0, 2)
+    bloques = np.asarray(A[filas.ravel(), columnas.ravel()]).reshape(5, 5, R)
+    inversas = np.linalg.inv(bloques.transpose(2, 0, 1))
+    precondicionador = LinearOperator((n, n), lambda x: (inversas @ x.reshape(5, R).T[:, :, None]).T.ravel())
+
+    def resolver(b):
+        x, info = gmres(A, b, M=precondicionador, rtol=rtol, atol=0.0)
+        return x
+
+    return resolver
+
+
+FACTORIZACIONES = {'directa': factorizar_dispersa, 'iterativa': factorizar_iterativa}
+
+# Con lineal='auto' se usa splu si el ancho de banda de la red, ordenada con
+# Cuthill-McKee inverso, es a lo sumo ANCHO_DIRECTA: el relleno de la LU es
+# del orden de R por ese ancho. Con Euler Backward en 150 días:
+#     rejilla de 3000 regiones (ancho 54): splu 1.7 s, GMRES 2.0 s
+#     red aleatoria con 5 enlaces por región, R = 300 (ancho 211): 0.9 s y 0.55 s
+#     la misma con R = 1000 (ancho 663): 17 s y 1.2 s; con R = 3000 splu
+#     pasa de 5 minutos y 1 GB, GMRES tarda 3.3 s.
+ANCHO_DIRECTA = 64
+
+
+def elegir_lineal(sistema):
+    return 'directa' if sistema.ancho <= ANCHO_DIRECTA else 'iterativa'
+
+
+def _factorizacion(sistema, lineal):
+    return FACTORIZACIONES[elegir_lineal(sistema) if lineal == 'auto' else lineal]
+
+
+# Condiciones iniciales (5, R): z0 puede ser (5,), igual en todas las
+# regiones, o (5, R). Por defecto logica.iniciales.
+def iniciales(sistema, z0=None):
+    z0 = np.asarray(logica.iniciales if z0 is None else z0, dtype=float)
+    return np.array(np.broadcast_to(z0.reshape(5, -1), (5, sistema.R)))
+
+
+# -------------------------    REGISTRO DE MÉTODOS   ---------------------------
+
+# Mismo formato que logica.METODOS. Cada función tiene la firma
+# funcion(sistema, time, z0=None, estado=None) y devuelve una vista (5, R, T)
+# de un arreglo contiguo (R, 5, T), como init_arr para un lote.
+# 'lote' tiene el significado de logica (integrar M escenarios a la vez); aquí
+# no hay conjuntos de escenarios, sólo las R regiones de un sistema, así que
+# es False en todos. Auto no está: decide con el espectro de una jacobiana
+# densa, que con miles de regiones no se calcula.
+METODOS = {}
+
+
+def registrar(nombre):
+    metodo = logica.METODOS[nombre]
+
+    def decorador(funcion):
+        METODOS[nombre] = metodo._replace(funcion=funcion, lote=False)
+        return funcion
+
+    return decorador
+
+
+@registrar('Euler Forward')
+def euler_forward(sistema, time, z0=None, estado=None):
+    return logica.integrar_explicito(logica.paso_euler, sistema.rhs, time, iniciales(sistema, z0),
+                                     logica.estadisticas_de(estado))
+
+
+@registrar('Runge-Kutta 2')
+def runge_2(sistema, time, z0=None, estado=None):
+    return logica.integrar_explicito(logica.paso_rk2, sistema.rhs, time, iniciales(sistema, z0),
+                                     logica.estadisticas_de(estado), 2)
+
+
+@registrar('Runge-Kutta 4')
+def runge_4(sistema, time, z0=None, estado=None):
+    return logica.integrar_explicito(logica.paso_rk4, sistema.rhs, time, iniciales(sistema, z0),
+                                     logica.estadisticas_de(estado), 4)
+
+
+# Métodos implícitos: logica.integrar_theta con sistema.rhs y la jacobiana
+# dispersa del sistema.
+# param lineal: 'auto', 'directa' (splu) o 'iterativa' (GMRES), ver
+# FACTORIZACIONES y elegir_lineal.
+@registrar('Euler Backward')
+def euler_backward(sistema, time, z0=None, estado=None, lineal='auto'):
+    return logica.integrar_theta('Euler Backward', 1.0, sistema.rhs, sistema.jacobiana, time,
+                                 iniciales(sistema, z0), estado, _factorizacion(sistema, lineal))
+
+
+@registrar('Euler Modified')
+def euler_modified(sistema, time, z0=None, estado=None, lineal='auto'):
+    return logica.integrar_theta('Euler Modified', 0.5, sistema.rhs, sistema.jacobiana, time,
+                                 iniciales(sistema, z0), estado, _factorizacion(sistema, lineal))
+
+
+# odeint sólo acepta jacobianas densas, que con miles de regiones no caben:
+# aquí se usa BDF de solve_ivp, también de orden y paso variables, con la
+# jacobiana dispersa (que factoriza con splu).
+@registrar('odeint/ivp-solve')
+def ivp(sistema, time, z0=None, estado=None, rtol=1e-6, atol=1e-9):
+    z = logica.init_arr(time, iniciales(sistema, z0))
+    z[...] = logica.integrar_bdf(sistema.rhs, sistema.jacobiana, time, z[..., 0], rtol, atol,
+                                 logica.estadisticas_de(estado))
+    return z
+
+
+@registrar('Dormand-Prince 5(4)')
+def dormand_prince(sistema, time, z0=None, rtol=1e-6, atol=1e-9, h0=None, estado=None):
+    return logica.integrar_dp(sistema.rhs, time, iniciales(sistema, z0), rtol, atol, h0, estado)
+
+
+# Resuelve el sistema de regiones con un método registrado en METODOS.
+# param1: method: Nombre del método (los mismos de logica).
+# param2: sistema: Metapoblacion.
+# param3: range: Malla de tiempo con T puntos.
+# param4: z0: Condiciones iniciales (5,) o (5, R).
+# Devuelve una Solucion (R, 5, T) con los parámetros (R, 7) de cada región.
+def solve(method, sistema, range, z0=None, dtype=None, **opciones):
+    if method not in METODOS:
+        raise KeyError("%s no está disponible con regiones; use uno de: %s" % (method, ', '.join(METODOS)))
+    estado = opciones.pop('estado', None)
+    if estado is None:
+        estado = {}
+    z = METODOS[method].funcion(sistema, range, z0, estado=estado, **opciones)
+    return Solucion(np.moveaxis(z, 0, 1), range, sistema.params, method, dtype, estado.get('estadisticas'),
+                    {'regiones': sistema.R, 'opciones': opciones})
+
+
+# Suma de las regiones ponderada por sus poblaciones: fracciones del total
+# del país, como una Solucion (5, T).
+# param2: poblaciones: Habitantes de cada región (R,).
+def total(solucion, poblaciones):
+    pesos = np.asarray(poblaciones, dtype=float)
+    z = np.tensordot(pesos / pesos.sum(), solucion.z, axes=(0, 0))
+    return Solucion(z, solucion.t, None, solucion.metodo, metadatos=solucion.metadatos)
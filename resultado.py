@@ -0,0 +1,150 @@
+'''
+=============================================================
+                SOLUCIÓN DEL MODELO (RESULTADO)
+=============================================================
+
+Una Solucion guarda la trayectoria en un único arreglo contiguo z de forma
+(5, T), o (M, 5, T) para un lote, junto con la malla de tiempo t, los
+parámetros, el método y los metadatos de la integración (estadísticas,
+elecciones de Auto, opciones).
+
+Sigue comportándose como la matriz que devolvían los métodos:
+    s, e, i, r, p = solucion         (cada fila es una vista de z)
+    solucion[:, :n], solucion.shape, np.asarray(solucion), solucion - otra
+y además ofrece vistas con nombre (solucion.i, solucion['i']) y recortes o
+submuestreos que tampoco copian los datos (ventana, submuestrear).
+'''
+
+import numpy as np
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+COMPARTIMENTOS = ('s', 'e', 'i', 'r', 'p')
+
+
+class Solucion(NDArrayOperatorsMixin):
+    # param1: z: Arreglo (5, T) o (M, 5, T).
+    # param2: t: Malla de tiempo con T puntos.
+    # param3: params: Parámetros (7,) o (M, 7).
+    # param4: metodo: Nombre del método con que se calculó.
+    # param5: dtype: Tipo de los datos guardados (por ejemplo np.float32 para
+    # barridos grandes); por defecto se conserva el de z.
+    # param6: estadisticas: logica.Estadisticas de la integración (o None).
+    # param7: metadatos: Diccionario con el resto de la información.
+    def __init__(self, z, t, params=None, metodo=None, dtype=None, estadisticas=None, metadatos=None):
+        self.z = np.ascontiguousarray(z, dtype=dtype)
+        self.t = np.asarray(t)
+        self.params = None if params is None else np.asarray(params, dtype=float)
+        self.metodo = metodo
+        self.estadisticas = estadisticas
+        self.metadatos = {} if metadatos is None else metadatos
+        if self.z.shape[-1] != len(self.t):
+            raise ValueError("z tiene %d puntos y la malla %d" % (self.z.shape[-1], len(self.t)))
+
+    # Nueva Solucion con los mismos datos descriptivos y otra trayectoria.
+    def _con(self, z, t):
+        solucion = Solucion.__new__(Solucion)
+        solucion.z, solucion.t = z, t
+        solucion.params, solucion.metodo = self.params, self.metodo
+        solucion.estadisticas, solucion.metadatos = self.estadisticas, self.metadatos
+        return solucion
+
+    # ------------------------   COMO ARREGLO   ------------------------------
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return np.array(self.z, dtype=dtype)
+        return self.z if dtype is None else self.z.astype(dtype, copy=False)
+
+    # Las operaciones de numpy (solucion - referencia, np.abs(solucion)) se
+    # hacen sobre z y devuelven arreglos.
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        inputs = tuple(x.z if isinstance(x, Solucion) else x for x in inputs)
+        if 'out' in kwargs:
+            kwargs['out'] = tuple(x.z if isinstance(x, Solucion) else x for x in kwargs['out'])
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    def __iter__(self):
+        return iter(self.z)
+
+    def __len__(self):
+        return len(self.z)
+
+    # Un nombre ('i') da la fila del compartimento; cualquier otro índice se
+    # aplica sobre z y devuelve un arreglo.
+    def __getitem__(self, indice):
+        if isinstance(indice, str):
+            return self.z[..., COMPARTIMENTOS.index(indice), :]
+        return self.z[indice]
+
+    @property
+    def shape(self):
+        return self.z.shape
+
+    @property
+    def dtype(self):
+        return self.z.dtype
+
+    @property
+    def ndim(self):
+        return self.z.ndim
+
+    @property
+    def nbytes(self):
+        return self.z.nbytes + self.t.nbytes
+
+    @property
+    def flags(self):
+        return self.z.flags
+
+    def __repr__(self):
+        return "Solucion(metodo=%r, forma=%s, t=[%g, %g], dtype=%s)" % (
+            self.metodo, self.z.shape, self.t[0] if len(self.t) else np.nan,
+            self.t[-1] if len(self.t) else np.nan, self.z.dtype)
+
+    # ------------------------   VISTAS CON NOMBRE   --------------------------
+
+    @property
+    def s(self):
+        return self.z[..., 0, :]
+
+    @property
+    def e(self):
+        return self.z[..., 1, :]
+
+    @property
+    def i(self):
+        return self.z[..., 2, :]
+
+    @property
+    def r(self):
+        return self.z[..., 3, :]
+
+    @property
+    def p(self):
+        return self.z[..., 4, :]
+
+    # ------------------------   RECORTES SIN COPIA   -------------------------
+
+    # Puntos inicio:fin:cada de la malla (índices, como en un slice).
+    def ventana(self, inicio=None, fin=None, cada=None):
+        corte = slice(inicio, fin, cada)
+        return self._con(self.z[..., corte], self.t[corte])
+
+    # Uno de cada 'cada' puntos.
+    def submuestrear(self, cada):
+        return self.ventana(cada=cada)
+
+    # Puntos con t_inicio <= t <= t_fin.
+    def entre(self, t_inicio, t_fin):
+        return self.ventana(np.searchsorted(self.t, t_inicio, 'left'), np.searchsorted(self.t, t_fin, 'right'))
+
+    # Trayectoria m de un lote (M, 5, T), como Solucion (5, T).
+    def trayectoria(self, m):
+        solucion = self._con(self.z[m], self.t)
+        if self.params is not None and self.params.ndim == 2:
+            solucion.params = self.params[m]
+        return solucion
+
+    # Copia con otro tipo de datos, por ejemplo como(np.float32) para guardar.
+    def como(self, dtype):
+        return self._con(self.z.astype(dtype), self.t)
@@ -0,0 +1,123 @@
+'''
+=============================================================
+            SENSIBILIDADES DEL MODELO A LOS PARÁMETROS
+=============================================================
+
+Derivadas de la trayectoria (s, e, i, r, p) respecto a los 7 parámetros
+k, a_i, a_e, y, b, rho, mu (y opcionalmente a las condiciones iniciales),
+sin diferencias finitas.
+
+Modo hacia adelante: se integra el sistema aumentado
+    dz/dt = F(z),   dS/dt = J_z S + J_param,   S(0) = 0
+junto con las ecuaciones de aux_odeint en una sola llamada a odeint. Da el
+tensor completo S[param, compartimento, t] de forma (7, 5, T).
+
+Modo adjunto: para un objetivo escalar G (el pico de infectados, o el valor
+final de un compartimento) se integra el adjunto hacia atrás
+    dl/dt = -J_z^T l,   dm/dt = -J_param^T l,   l(t*) = dG/dz,   m(t*) = 0
+y dG/dparam = m(t0), dG/dz0 = l(t0). Cuesta una integración hacia adelante
+y otra hacia atrás sin importar cuántos parámetros haya.
+'''
+
+from collections import namedtuple
+
+import numpy as np
+
+import logica
+
+COMPARTIMENTOS = ('s', 'e', 'i', 'r', 'p')
+
+# Resultado del modo adjunto: valor del objetivo, instante en que se evalúa,
+# gradiente respecto a los 7 parámetros y respecto a las condiciones iniciales.
+Gradiente = namedtuple('Gradiente', ['valor', 'tiempo', 'params', 'iniciales'])
+
+
+# Sistema aumentado para odeint: las 5 ecuaciones de aux_odeint seguidas de
+# las 5 * n sensibilidades, con n = 7 (o 12 si se incluyen las iniciales).
+def aux_sensibilidades(y, t, *params):
+    z = y[:5]
+    S = y[5:].reshape(5, -1)
+    dS = logica.jacobiana(z, params).dot(S)
+    dS[:, :7] += logica.jacobiana_parametros(z, params)
+    return np.concatenate((logica.aux_odeint(z, t, *params), dS.ravel()))
+
+
+# MODO HACIA ADELANTE:
+# param1: params: k, a_i, a_e, y, b, rho, mu.
+# param2: range: Malla de tiempo con T puntos.
+# param3: z0: Condiciones iniciales (por defecto logica.iniciales).
+# param4: con_iniciales: Agregar las derivadas respecto a s0, e0, i0, r0, p0.
+# Devuelve (z, S): la trayectoria (5, T) y el tensor (7, 5, T), o (12, 5, T)
+# con las iniciales, donde S[j, a, t] = dz_a(t)/dparam_j.
+def sensibilidades(params, range, z0=None, con_iniciales=False, rtol=1e-8, atol=1e-10):
+    from scipy.integrate import odeint
+    n = 12 if con_iniciales else 7
+    S0 = np.zeros((5, n))
+    if con_iniciales:
+        S0[:, 7:] = np.eye(5)
+    z0 = np.asarray(logica.iniciales if z0 is None else z0, dtype=float)
+    y = odeint(aux_sensibilidades, np.concatenate((z0, S0.ravel())), range, args=tuple(params),
+               rtol=rtol, atol=atol)
+    return y[:, :5].T, y[:, 5:].reshape(len(range), 5, n).transpose(2, 1, 0)
+
+
+# Instante del máximo de i(t) en [t0, t_final], refinado sobre la solución
+# densa como la raíz de di/dt (F3) entre los nodos vecinos al máximo discreto.
+def _pico(trayectoria, params, t0, t_final, nodos=2048):
+    from scipy.optimize import brentq
+    t = np.linspace(t0, t_final, nodos)
+    i = trayectoria(t)[2]
+    n = int(np.argmax(i))
+    if n == 0 or n == nodos - 1:
+        return t[n]
+    k, a_i, a_e, y, b, rho, mu = params
+    derivada = lambda tau: logica.F3(*trayectoria(tau)[1:3], k, b, mu)
+    return brentq(derivada, t[n - 1], t[n + 1], xtol=1e-12)
+
+
+# MODO ADJUNTO:
+# param1: params: k, a_i, a_e, y, b, rho, mu.
+# param2: range: Malla de tiempo; sólo se usan su primer y último valor.
+# param3: objetivo: 'pico' (máximo de i(t), el valor y su instante se
+# refinan sobre la solución densa), el nombre de un compartimento ('p' para
+# el valor final de p) o una función g(z) -> (valor, dG/dz) evaluada en el
+# último instante.
+# param4: z0: Condiciones iniciales (por defecto logica.iniciales).
+# En el pico di/dt = 0, así que mover el instante del máximo no cambia G y
+# basta con el adjunto de i(t*).
+def adjunto(params, range, objetivo='pico', z0=None, rtol=1e-8, atol=1e-10):
+    from scipy.integrate import solve_ivp
+    params = tuple(float(valor) for valor in params)
+    z0 = np.asarray(logica.iniciales if z0 is None else z0, dtype=float)
+    t0, t_final = float(range[0]), float(range[-1])
+
+    adelante = solve_ivp(lambda t, z: logica.rhs(z, params), (t0, t_final), z0, method='LSODA',
+                         jac=lambda t, z: logica.jacobiana(z, params), dense_output=True, rtol=rtol, atol=atol)
+    trayectoria = adelante.sol
+
+    if objetivo == 'pico':
+        t_obj = _pico(trayectoria, params, t0, t_final)
+        valor, dg = trayectoria(t_obj)[2], np.eye(5)[2]
+    elif objetivo in COMPARTIMENTOS:
+        t_obj = t_final
+        fila = COMPARTIMENTOS.index(objetivo)
+        valor, dg = trayectoria(t_obj)[fila], np.eye(5)[fila]
+    elif callable(objetivo):
+        t_obj = t_final
+        valor, dg = objetivo(trayectoria(t_obj))
+    else:
+        raise ValueError("objetivo desconocido: %s" % objetivo)
+
+    # Estado atrás: (l, m) con l de 5 componentes y m de 7.
+    def atras(t, y):
+        z = trayectoria(t)
+        l = y[:5]
+        return np.concatenate((-logica.jacobiana(z, params).T.dot(l),
+                               -logica.jacobiana_parametros(z, params).T.dot(l)))
+
+    if t_obj == t0:
+        final = np.concatenate((dg, np.zeros(7)))
+    else:
+        final = solve_ivp(atras, (t_obj, t0), np.concatenate((dg, np.zeros(7))), method='LSODA',
+                          rtol=rtol, atol=atol).y[:, -1]
+    return Gradiente(float(valor), float(t_obj), final[5:], final[:5])
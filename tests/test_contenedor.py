@@ -0,0 +1,13 @@
+import numpy as np
+
+import contenedor
+
+
+# Los .sd antiguos guardan 7 float32; se leen con el valor decimal guardado.
+def test_params_de_archivo_antiguo(tmp_path):
+    ruta = str(tmp_path / 'antiguo.sd')
+    guardados = [0.4, 0.005, 0.65, 0.0, 0.1, 0.08, 0.02]
+    np.array(guardados, dtype=np.float32).tofile(ruta)
+    params = contenedor.leer_params(ruta)
+    assert params.dtype == float
+    assert list(params) == guardados
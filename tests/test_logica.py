@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import edades
+import logica
+from barrido import BASE
+
+
+# Con una malla de un solo punto la solución es la condición inicial (por
+# ejemplo con una duración de 1 en la interfaz o solve_por_bloques con bloque=1).
+@pytest.mark.parametrize('method', ['odeint/ivp-solve', 'Euler Backward', 'Runge-Kutta 4'])
+def test_malla_de_un_punto(method):
+    z = logica.solve(method, BASE, np.arange(0, 1))
+    assert z.shape == (5, 1)
+    np.testing.assert_allclose(z[:, 0], logica.iniciales)
+
+
+def test_malla_de_un_punto_por_edades():
+    sistema = edades.Edades(BASE, edades.homogenea([1.0, 2.0]))
+    z = edades.solve('odeint/ivp-solve', sistema, np.arange(0, 1))
+    assert z.shape == (2, 5, 1)
+
+
+def test_bloques_de_un_punto():
+    t = np.arange(0, 5.)
+    bloques = list(logica.solve_por_bloques('odeint/ivp-solve', BASE, t, bloque=1))
+    z = np.concatenate([np.asarray(b) for b in bloques], axis=-1)
+    np.testing.assert_allclose(z, logica.solve('odeint/ivp-solve', BASE, t), atol=1e-6)
+
+
+# En el modo de paso grueso los ganchos sólo ven pasos aceptados, en orden, y
+# el error queda por debajo del de h = 1.
+@pytest.mark.parametrize('method', ['Euler Backward', 'Euler Modified'])
+def test_paso_grueso(method):
+    t = np.arange(0, 150.)
+    vistos = []
+    estado = {'estadisticas': logica.Estadisticas(al_paso=lambda tiempo, z: vistos.append(tiempo))}
+    z = logica.solve(method, BASE, t, paso=7, estado=estado)
+    assert np.all(np.diff(vistos) > 0)
+    assert estado['estadisticas'].pasos == len(vistos)
+    assert np.asarray(z).min() >= 0
+    referencia = np.asarray(logica.solve('odeint/ivp-solve', BASE, t))
+    assert np.abs(np.asarray(z) - referencia).max() < 0.02
+
+
+# Con contactos homogéneos y los mismos parámetros, el promedio de los grupos
+# es la solución de logica; en un conjunto, cada escenario la de un solo sistema.
+@pytest.mark.parametrize('method', ['Dormand-Prince 5(4)', 'Auto'])
+def test_adaptativos_por_edades(method):
+    t = np.arange(0, 151.)
+    pesos = [1.0, 2.0, 3.0]
+    solucion = edades.solve(method, edades.Edades(BASE, edades.homogenea(pesos)), t)
+    np.testing.assert_allclose(edades.total(solucion, pesos).z, logica.solve(method, BASE, t), atol=1e-12)
+    conjunto = edades.solve(method, edades.Edades(np.tile(BASE, (2, 3, 1)), edades.homogenea(pesos)), t)
+    np.testing.assert_allclose(conjunto.z[1], solucion.z, atol=1e-12)
+    assert edades.METODOS[method].lote == logica.METODOS[method].lote
@@ -0,0 +1,26 @@
+import numpy as np
+
+import logica
+from barrido import BASE
+from reductores import Agregado, Pico, Submuestreo, reducir
+
+
+def _lote():
+    params = np.array([BASE, BASE])
+    params[1, 2] *= 0.5  # a_e menor en la segunda trayectoria
+    return params, np.array([logica.iniciales, logica.iniciales])
+
+
+# Un lote por bloques da los mismos resúmenes que solve_batch completo.
+def test_lote_por_bloques():
+    params, z0 = _lote()
+    t = np.arange(0, 300.)
+    completo = logica.solve_batch('Runge-Kutta 4', params, z0, t)
+    bloques = logica.solve_por_bloques('Runge-Kutta 4', params.T, t, bloque=70, z0=z0.T)
+    pico, diario, muestra = reducir(bloques, Pico('i'), Agregado(10.0), Submuestreo(7))
+    i = completo.z[:, 2]
+    np.testing.assert_allclose(pico[0], i.max(axis=-1))
+    np.testing.assert_array_equal(pico[1], t[i.argmax(axis=-1)])
+    assert diario.shape == (2, 5, 30)
+    np.testing.assert_allclose(diario.z[..., 3], completo.z[..., 30:40].mean(axis=-1))
+    np.testing.assert_allclose(muestra.z, completo.z[..., ::7])